@@ -0,0 +1,263 @@
+"""
+Ambulance Lane Module
+Dedicated ambulance detection on the shared frame stream, separate from the
+parking pipeline so emergency alerts never queue behind parking work.
+
+The lane samples the newest camera frame at its own rate and searches only
+the layout's ambulance ROI, within size bounds. A sighting is confirmed
+after confirm_frames hits within the last window samples and cleared after
+clear_frames consecutive misses. While a sighting awaits confirmation the
+lane samples every new frame instead of waiting for its next slot.
+
+Ambulance passes preempt parking passes through a shared PriorityGate:
+the parking worker waits at the start of each pass while a lane pass is
+running or a sighting is pending, up to max_wait so parking never starves.
+With a DetectionPool the search runs in a worker process, like parking.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+
+from car_detection import default_layout, find_ambulances, load_cascades
+from metrics import AMBULANCE_SECONDS, PARKING_PREEMPTED_SECONDS
+from profiling import checkpoint
+from scheduler import PRIORITY_AMBULANCE, ScheduledTask
+
+
+class PriorityGate:
+    """Holds off background passes while urgent work runs or is pending"""
+
+    def __init__(self, max_wait=1.0):
+        self.max_wait = max_wait
+        self.condition = threading.Condition()
+        self.urgent = 0
+        self.held = False
+        self.yields = 0
+
+    @contextmanager
+    def run_urgent(self):
+        with self.condition:
+            self.urgent += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.urgent -= 1
+                self.condition.notify_all()
+
+    def hold(self, held):
+        with self.condition:
+            self.held = held
+            if not held:
+                self.condition.notify_all()
+
+    def wait_turn(self, name=''):
+        """Block a background pass until no urgent work is running or pending (at most max_wait)"""
+        with self.condition:
+            if not self.urgent and not self.held:
+                return 0.0
+            started = time.perf_counter()
+            self.condition.wait_for(lambda: not self.urgent and not self.held, timeout=self.max_wait)
+            self.yields += 1
+        waited = time.perf_counter() - started
+        PARKING_PREEMPTED_SECONDS.observe(waited, name)
+        return waited
+
+
+@dataclass(frozen=True)
+class AmbulanceResult:
+    """Immutable ambulance lane snapshot for a single sampled frame"""
+    frame_seq: int
+    captured_at: float
+    processed_at: float
+    detections: tuple = ()     # (x, y, w, h, confidence) in feed coordinates
+    confirmed: bool = False
+    hits: int = 0              # hits within the confirmation window
+    first_seen_at: float = None
+    detection_ms: float = 0.0
+
+    @property
+    def confidence(self):
+        return max((detection[4] for detection in self.detections), default=0.0)
+
+    def to_dict(self):
+        return {
+            'ambulance_detected': self.confirmed,
+            'boxes': [list(detection[:4]) for detection in self.detections],
+            'confidence': self.confidence,
+            'confidences': [detection[4] for detection in self.detections],
+            'hits': self.hits,
+            'frame_seq': self.frame_seq,
+            'captured_at': self.captured_at,
+            'first_seen_at': self.first_seen_at,
+            'timestamp': self.processed_at
+        }
+
+
+class AmbulanceLane:
+    """Background worker that samples frames for ambulances at its own cadence"""
+
+    def __init__(self, camera, layout=None, gate=None, fps=5.0, confirm_frames=3, window=5, clear_frames=10,
+                 task=None, pool=None):
+        self.camera = camera
+        self.layout = layout or default_layout
+        self.gate = gate
+        self.pool = pool  # DetectionPool running the cascade in worker processes
+        self.task = task or ScheduledTask('ambulance', camera.name, PRIORITY_AMBULANCE,
+                                          target_fps=fps if fps > 0 else None)
+        self.confirm_frames = max(1, confirm_frames)
+        self.window = deque(maxlen=max(self.confirm_frames, window))
+        self.clear_frames = max(1, clear_frames)
+        self.enabled = False  # decided during warm-up
+        self.warmed_up = False
+        self.confirmed = False
+        self.misses = 0
+        self.first_seen_at = None
+        self.processed_fps = 0.0
+        self._last_cycle = None
+        self.condition = threading.Condition()
+        self.result = None
+        self.listeners = []
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(), name=f"ambulance-{camera.name}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _warm_up(self):
+        self.enabled = load_cascades()['ambulance']
+        if self.enabled:
+            blank = np.zeros((self.layout.feed_height, self.layout.feed_width, 3), dtype=np.uint8)
+            try:
+                self.search(blank)
+            except Exception as e:
+                print(f"Error warming up ambulance lane for camera {self.camera.name}: {e}")
+        else:
+            print(f"⚠️  Ambulance cascade not loaded - ambulance lane disabled for camera {self.camera.name}")
+        self.warmed_up = True
+
+    def _run(self):
+        self._warm_up()
+        last_seq = 0
+        while self.running and self.enabled:
+            checkpoint()
+            # Sample at the lane's own rate unless a sighting needs confirming
+            delay = self.task.delay()
+            if delay > 0 and not (self.window_hits() and not self.confirmed):
+                with self.condition:
+                    self.condition.wait_for(lambda: not self.running, timeout=delay)
+                continue
+
+            lease = self.camera.acquire(after_seq=last_seq, timeout=0.5)
+            if lease is None:
+                if not self.camera.running:
+                    break
+                continue
+            with lease:
+                last_seq = lease.seq
+                if self.gate is not None:
+                    with self.gate.run_urgent():
+                        result = self.process(lease.frame, lease.seq, lease.timestamp)
+                else:
+                    result = self.process(lease.frame, lease.seq, lease.timestamp)
+            if self.gate is not None:
+                self.gate.hold(result.hits > 0 and not result.confirmed)
+            self.task.record(result.processed_at - result.detection_ms / 1000.0, result.detection_ms / 1000.0)
+            self._record_cycle()
+            self._publish(result)
+
+        if self.gate is not None:
+            self.gate.hold(False)
+
+    def window_hits(self):
+        return sum(self.window)
+
+    def _record_cycle(self):
+        now = time.time()
+        if self._last_cycle is not None:
+            self.processed_fps = 0.9 * self.processed_fps + 0.1 / max(now - self._last_cycle, 1e-6)
+        self._last_cycle = now
+
+    def search(self, frame):
+        if self.pool is not None:
+            return self.pool.find_ambulances(frame, self.layout)
+        return find_ambulances(frame, self.layout)
+
+    def process(self, frame, seq, captured_at):
+        """Search one frame and advance the confirmation state"""
+        started = time.time()
+        detections = tuple(self.search(frame))
+        finished = time.time()
+        AMBULANCE_SECONDS.observe(finished - started, self.camera.name)
+
+        hit = len(detections) > 0
+        self.window.append(hit)
+        if hit and self.first_seen_at is None:
+            self.first_seen_at = captured_at
+
+        if not self.confirmed:
+            if self.window_hits() >= self.confirm_frames:
+                self.confirmed = True
+                self.misses = 0
+            elif not self.window_hits():
+                self.first_seen_at = None
+        elif hit:
+            self.misses = 0
+        else:
+            self.misses += 1
+            if self.misses >= self.clear_frames:
+                self.confirmed = False
+                self.window.clear()
+                self.first_seen_at = None
+
+        return AmbulanceResult(
+            frame_seq=seq,
+            captured_at=captured_at,
+            processed_at=finished,
+            detections=detections,
+            confirmed=self.confirmed,
+            hits=self.window_hits(),
+            first_seen_at=self.first_seen_at,
+            detection_ms=(finished - started) * 1000.0
+        )
+
+    def _publish(self, result):
+        with self.condition:
+            self.result = result
+            self.condition.notify_all()
+        for listener in self.listeners:
+            try:
+                listener(result)
+            except Exception as e:
+                print(f"Error in ambulance listener: {e}")
+
+    def add_listener(self, callback):
+        """Call callback(result) from the lane thread for every sampled frame"""
+        self.listeners.append(callback)
+
+    def latest(self):
+        """Return the most recent snapshot, or None before the first sample"""
+        return self.result
+
+    def stats(self):
+        stats = {
+            'enabled': self.enabled,
+            'processed_fps': round(self.processed_fps, 2),
+            'target_fps': self.task.target_fps,
+            'allowed_fps': round(self.task.allowed_fps, 2) if self.task.allowed_fps is not None else None,
+            'confirmed': self.confirmed,
+            'window_hits': self.window_hits()
+        }
+        if self.gate is not None:
+            stats['parking_yields'] = self.gate.yields
+        return stats
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join()
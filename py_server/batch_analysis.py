@@ -0,0 +1,206 @@
+"""
+Batch Analysis Module
+Offline occupancy analysis of recorded footage, without the Flask server.
+
+    python batch_analysis.py recordings/*.mp4 --stride 15 --jobs 4 -o timeline.csv
+    python batch_analysis.py day1.mp4 --interval 60 -o day1.npz
+
+Each sampled frame goes through get_parking_status and detect_ambulance.
+Files are processed in parallel, one worker process per file.
+
+CSV output has one row per occupancy change (every sampled frame with
+--every-frame, one row per window with --interval) plus a sibling
+*_ambulance.csv of ambulance hits. .npz output stores the same timeline
+column-wise with a packed spots x samples occupancy matrix.
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from frame_source import open_frame_source
+
+
+def _worker_init(single_thread):
+    # One OpenCV thread per process avoids oversubscribing the cores
+    if single_thread:
+        cv2.setNumThreads(1)
+
+
+def analyze_video(path, stride=1, layout_path=None, with_ambulance=True):
+    """Sample every stride-th frame of a recording; returns the per-sample timeline"""
+    from car_detection import default_layout, detect_ambulance, get_parking_status, load_cascades, load_layout
+
+    layout = load_layout(layout_path) if layout_path else default_layout
+    spot_ids = [spot['id'] for spot in layout.spots]
+    spot_index = {spot_id: index for index, spot_id in enumerate(spot_ids)}
+    # Checked once so a missing cascade does not log an error per frame
+    with_ambulance = with_ambulance and load_cascades()['ambulance']
+
+    source = open_frame_source(path)
+    if not source.is_opened():
+        raise IOError(f"Cannot open {path}")
+    fps = source.fps or 30.0
+
+    frames, occupancy, ambulance_frames = [], [], []
+    started = time.time()
+    frame_index = 0
+    try:
+        while True:
+            ok, frame = source.read()
+            if not ok:
+                break
+            row = np.zeros(len(spot_ids), dtype=bool)
+            for spot_id in get_parking_status(frame, layout):
+                row[spot_index[spot_id]] = True
+            frames.append(frame_index)
+            occupancy.append(row)
+            if with_ambulance and detect_ambulance(frame, layout):
+                ambulance_frames.append(frame_index)
+
+            # Skip ahead without decoding the frames in between
+            skipped = 0
+            while skipped < stride - 1 and source.skip():
+                skipped += 1
+            frame_index += skipped + 1
+    finally:
+        source.release()
+
+    return {
+        'path': path,
+        'fps': fps,
+        'spot_ids': spot_ids,
+        'frames': np.array(frames, dtype=np.int64),
+        'occupancy': np.array(occupancy, dtype=bool).reshape(-1, len(spot_ids)),
+        'ambulance_frames': ambulance_frames,
+        'decoded_frames': frame_index,
+        'elapsed': time.time() - started
+    }
+
+
+def summarize_intervals(result, interval):
+    """Collapse samples into fixed windows; a spot counts as occupied when it was in most samples"""
+    times = result['frames'] / result['fps']
+    windows = (times // interval).astype(np.int64)
+    starts, rows = [], []
+    for window in np.unique(windows):
+        samples = result['occupancy'][windows == window]
+        starts.append(window * interval)
+        rows.append(samples.mean(axis=0) >= 0.5)
+    return np.array(starts, dtype=np.float64), np.array(rows, dtype=bool).reshape(-1, len(result['spot_ids']))
+
+
+def timeline_rows(result, interval=None, every_frame=False):
+    """Yield (time in seconds, frame or None, occupancy row) for the CSV timeline"""
+    if interval:
+        starts, rows = summarize_intervals(result, interval)
+        for start, row in zip(starts, rows):
+            yield start, None, row
+        return
+
+    previous = None
+    for frame_index, row in zip(result['frames'], result['occupancy']):
+        # Only changes are written unless every sample was asked for
+        if every_frame or previous is None or not np.array_equal(row, previous):
+            yield frame_index / result['fps'], int(frame_index), row
+        previous = row
+
+
+def write_csv(results, output, interval=None, every_frame=False):
+    with open(output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'time_s', 'frame', 'occupied_count', 'occupied_spots'])
+        for result in results:
+            spot_ids = np.array(result['spot_ids'])
+            for seconds, frame_index, row in timeline_rows(result, interval, every_frame):
+                writer.writerow([result['path'], f"{seconds:.3f}",
+                                 '' if frame_index is None else frame_index,
+                                 int(row.sum()), ' '.join(spot_ids[row])])
+
+    ambulance_output = os.path.splitext(output)[0] + '_ambulance.csv'
+    with open(ambulance_output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'time_s', 'frame'])
+        for result in results:
+            for frame_index in result['ambulance_frames']:
+                writer.writerow([result['path'], f"{frame_index / result['fps']:.3f}", frame_index])
+    return [output, ambulance_output]
+
+
+def write_npz(results, output, interval=None):
+    arrays = {}
+    for number, result in enumerate(results):
+        prefix = f"f{number}_"
+        if interval:
+            times, occupancy = summarize_intervals(result, interval)
+        else:
+            times, occupancy = result['frames'] / result['fps'], result['occupancy']
+            arrays[prefix + 'frame'] = result['frames']
+        arrays[prefix + 'time_s'] = times
+        # Spots x samples, bit-packed along time
+        arrays[prefix + 'occupancy_bits'] = np.packbits(occupancy.T, axis=1)
+        arrays[prefix + 'samples'] = np.array(len(times))
+        arrays[prefix + 'ambulance_time_s'] = np.array(result['ambulance_frames'], dtype=np.float64) / result['fps']
+        arrays[prefix + 'spot_ids'] = np.array(result['spot_ids'])
+    arrays['files'] = np.array([result['path'] for result in results])
+    np.savez_compressed(output, **arrays)
+    return [output]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline parking occupancy analysis for recorded video")
+    parser.add_argument('videos', nargs='+', help="video files (or image directories) to analyse")
+    parser.add_argument('-o', '--output', default='occupancy_timeline.csv', help=".csv or .npz timeline file")
+    parser.add_argument('--stride', type=int, default=1, help="analyse every Nth frame")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="files processed in parallel")
+    parser.add_argument('--interval', type=float, help="summarise occupancy per window of this many seconds")
+    parser.add_argument('--every-frame', action='store_true', help="write every sampled frame, not just changes")
+    parser.add_argument('--layout', help="JSON parking layout to use instead of the built-in one")
+    parser.add_argument('--no-ambulance', action='store_true', help="skip ambulance detection")
+    args = parser.parse_args()
+
+    jobs = max(1, min(args.jobs, len(args.videos)))
+    stride = max(1, args.stride)
+    print(f"🎬 Analysing {len(args.videos)} recording(s) with {jobs} worker(s), stride {stride}")
+
+    started = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_worker_init, initargs=(jobs > 1,)) as executor:
+        futures = [executor.submit(analyze_video, path, stride, args.layout, not args.no_ambulance)
+                   for path in args.videos]
+        for path, future in zip(args.videos, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {path}: {e}")
+                continue
+            samples = len(result['frames'])
+            print(f"✅ {path}: {samples} frames analysed ({result['decoded_frames']} read) in "
+                  f"{result['elapsed']:.1f}s - {samples / max(result['elapsed'], 1e-6):.1f} fps, "
+                  f"{len(result['ambulance_frames'])} ambulance hits")
+            results.append(result)
+
+    elapsed = time.time() - started
+    if not results:
+        print("❌ No recordings could be analysed")
+        return
+
+    if args.output.endswith('.npz'):
+        written = write_npz(results, args.output, args.interval)
+    else:
+        written = write_csv(results, args.output, args.interval, args.every_frame)
+
+    analysed = sum(len(result['frames']) for result in results)
+    read = sum(result['decoded_frames'] for result in results)
+    print(f"📊 {analysed} frames analysed ({read} frames of footage) in {elapsed:.1f}s - "
+          f"{analysed / max(elapsed, 1e-6):.1f} analysed fps, {read / max(elapsed, 1e-6):.1f} footage fps")
+    print(f"💾 Wrote {', '.join(written)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Benchmark Module
+Times the detection and rendering hot path on fixed frames and writes the
+results as JSON so runs can be compared.
+
+    python benchmark.py -o bench.json
+    python benchmark.py --frames recordings/lot.mp4 --baseline bench.json
+
+Without --frames a seeded synthetic 1280x720 scene is used, so results are
+reproducible on any machine. With --baseline the run exits non-zero when a
+stage's median is more than --tolerance slower than in the baseline file.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import car_detection
+from car_detection import (ParkingLayout, analyze_parking, assign_detections, assign_detections_indexed,
+                           default_layout, detect_ambulance, draw_enhanced_parking_overlay,
+                           get_car_cascade, get_detection_size, load_cascades, resize_to_feed)
+from frame_source import open_frame_source
+from overlay_cache import OverlayRenderer
+
+JPEG_QUALITY = 80
+
+
+def synthetic_frames(count=8, width=1280, height=720, seed=0):
+    """Textured asphalt with dark car-sized blocks in a seeded subset of the spots"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = rng.integers(70, 110, size=(height, width, 3), dtype=np.uint8)
+        for spot in default_layout.scaled_spots((width, height)):
+            if rng.random() < 0.5:
+                x, y, w, h = spot['x'], spot['y'], spot['width'], spot['height']
+                color = tuple(int(c) for c in rng.integers(0, 255, size=3))
+                cv2.rectangle(frame, (x + 8, y + 6), (x + w - 8, y + h - 6), color, -1)
+                cv2.rectangle(frame, (x + 20, y + 10), (x + w - 20, y + h // 2), (30, 30, 30), -1)
+        frames.append(frame)
+    return frames
+
+
+def load_frames(path, count=8):
+    """Evenly spaced frames from a recording or image directory.
+
+    At most 2 * count frames are held at once: whenever the kept frames reach
+    that, every other one is dropped and the stride doubles. Frames between
+    strides are skipped without decoding.
+    """
+    source = open_frame_source(path)
+    frames = []
+    stride = 1
+    position = 0
+    try:
+        while True:
+            if position % stride:
+                if not source.skip():
+                    break
+            else:
+                ok, frame = source.read()
+                if not ok:
+                    break
+                frames.append(frame)
+                if len(frames) >= 2 * count:
+                    frames = frames[::2]
+                    stride *= 2
+            position += 1
+    finally:
+        source.release()
+    if not frames:
+        raise IOError(f"No frames could be read from {path}")
+    if len(frames) <= count:
+        return frames
+    return [frames[int(round(index))] for index in np.linspace(0, len(frames) - 1, count)]
+
+
+def synthetic_detections(layout, size, count, seed=0):
+    """Jittered boxes around spots, in detection coordinates, for timing the assignment alone"""
+    rng = np.random.default_rng(seed)
+    spots = layout.scaled_spots(size)
+    cars = []
+    for index in rng.integers(0, len(spots), size=count):
+        spot = spots[index]
+        cars.append((int(spot['x'] + rng.integers(-10, 10)), int(spot['y'] + rng.integers(-8, 8)),
+                     int(spot['width'] * rng.uniform(0.7, 1.1)), int(spot['height'] * rng.uniform(0.7, 1.1))))
+    return cars
+
+
+def grid_layout(rows, cols):
+    spots = [{'id': f"G{row}-{col}", 'x': 10 + col * 60, 'y': 10 + row * 40,
+              'width': 55, 'height': 35, 'section': f"G{row}"}
+             for row in range(rows) for col in range(cols)]
+    return ParkingLayout(spots, feed_width=10 + cols * 60, feed_height=10 + rows * 40, name='benchmark-grid')
+
+
+def time_stage(function, inputs, repeat, warmup=2):
+    """Run function over the inputs repeat times; returns per-call statistics in milliseconds"""
+    for item in inputs[:warmup]:
+        function(item)
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            started = time.perf_counter()
+            function(item)
+            samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'calls': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'min_ms': round(samples[0], 4),
+        'stdev_ms': round(statistics.stdev(samples), 4) if len(samples) > 1 else 0.0
+    }
+
+
+def run_benchmarks(frames, repeat=5, layout=None):
+    layout = layout or default_layout
+    detection_size = get_detection_size(frames[0].shape)
+    detection_frames = [cv2.resize(frame, detection_size, interpolation=cv2.INTER_AREA) for frame in frames]
+    min_size, max_size = layout.car_size_range(detection_size)
+    x1, y1, x2, y2 = layout.detection_rois(detection_frames[0].shape)[0]
+
+    def preprocess(frame):
+        gray = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        gray = cv2.equalizeHist(gray)
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    grays = [preprocess(frame) for frame in detection_frames]
+    cascade = get_car_cascade()
+    spot_boxes, thresholds = layout.spot_arrays(detection_size)
+    cars = [synthetic_detections(layout, detection_size, len(spot_boxes), seed) for seed in range(len(frames))]
+
+    big_layout = grid_layout(20, 40)
+    big_boxes, big_thresholds = big_layout.spot_arrays()
+    big_index = big_layout.spot_index()
+    big_cars = [synthetic_detections(big_layout, None, len(big_boxes), seed) for seed in range(len(frames))]
+
+    feed_frames = [resize_to_feed(frame, layout) for frame in frames]
+    occupied = [[spot['id'] for spot in layout.spots[::2]]] * len(frames)
+    renderer = OverlayRenderer(layout)
+    encode_params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+
+    stages = {
+        'preprocess': time_stage(preprocess, detection_frames, repeat),
+        'cascade': time_stage(lambda gray: cascade.detectMultiScale(gray, 1.05, 5, minSize=min_size,
+                                                                   maxSize=max_size), grays, repeat),
+        'assignment': time_stage(lambda boxes: assign_detections(boxes, spot_boxes, thresholds), cars, repeat * 20),
+        'assignment_800_spots_dense': time_stage(
+            lambda boxes: assign_detections(boxes, big_boxes, big_thresholds), big_cars, repeat),
+        'assignment_800_spots_indexed': time_stage(
+            lambda boxes: assign_detections_indexed(boxes, big_thresholds, big_index), big_cars, repeat),
+        'analyze_parking': time_stage(lambda frame: analyze_parking(frame, layout), frames, repeat),
+        'overlay_direct': time_stage(lambda index: draw_enhanced_parking_overlay(
+            feed_frames[index].copy(), occupied[index], layout), list(range(len(frames))), repeat),
+        'overlay_cached': time_stage(lambda index: renderer.draw(
+            feed_frames[index].copy(), occupied[index]), list(range(len(frames))), repeat),
+        'imencode': time_stage(lambda frame: cv2.imencode('.jpg', frame, encode_params), feed_frames, repeat)
+    }
+    if load_cascades()['ambulance']:
+        stages['detect_ambulance'] = time_stage(lambda frame: detect_ambulance(frame, layout), frames, repeat)
+    else:
+        stages['detect_ambulance'] = None
+
+    # End to end: detection, overlay and encode for every frame, as the live server does
+    def end_to_end(frame):
+        result = analyze_parking(frame, layout)
+        annotated = resize_to_feed(frame, layout)
+        if annotated is frame:
+            annotated = frame.copy()
+        renderer.draw(annotated, result['occupied_spots'])
+        cv2.imencode('.jpg', annotated, encode_params)
+
+    end_to_end_stats = time_stage(end_to_end, frames, repeat)
+    end_to_end_stats['fps'] = round(1000.0 / end_to_end_stats['mean_ms'], 2)
+    stages['end_to_end'] = end_to_end_stats
+    return stages
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'opencv_threads': cv2.getNumThreads(),
+        'git_commit': commit or None
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return the stages whose median regressed by more than tolerance (a fraction)"""
+    regressions = []
+    for stage, stats in results['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if not stats or not before:
+            continue
+        change = stats['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0.0
+        marker = '❌' if change > tolerance else '✅'
+        print(f"{marker} {stage}: {before['median_ms']:.3f} -> {stats['median_ms']:.3f} ms ({change:+.1%})")
+        if change > tolerance:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parking detection and rendering hot path")
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help="JSON results file")
+    parser.add_argument('--frames', help="video file or image directory to benchmark on instead of synthetic frames")
+    parser.add_argument('--count', type=int, default=8, help="number of distinct frames")
+    parser.add_argument('--repeat', type=int, default=5, help="passes over the frames per stage")
+    parser.add_argument('--layout', help="JSON parking layout to benchmark with")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed median slowdown, as a fraction")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.count) if args.frames else synthetic_frames(args.count)
+    layout = car_detection.load_layout(args.layout) if args.layout else default_layout
+    print(f"⏱️ Benchmarking on {len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, "
+          f"{args.repeat} passes per stage")
+
+    results = {
+        'timestamp': time.time(),
+        'environment': environment(),
+        'config': {
+            'frames': args.frames or 'synthetic',
+            'frame_count': len(frames),
+            'frame_shape': list(frames[0].shape),
+            'repeat': args.repeat,
+            'detection_width': car_detection.DETECTION_WIDTH,
+            'roi_mode': car_detection.DETECTION_ROI_MODE,
+            'jpeg_quality': JPEG_QUALITY,
+            'spots': len(layout.spots)
+        },
+        'stages': run_benchmarks(frames, args.repeat, layout)
+    }
+
+    for stage, stats in results['stages'].items():
+        if stats is None:
+            print(f"⚪ {stage}: skipped")
+        else:
+            print(f"📊 {stage}: median {stats['median_ms']:.3f} ms, p95 {stats['p95_ms']:.3f} ms")
+    print(f"🎞️ End to end: {results['stages']['end_to_end']['fps']} fps")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Camera Module
+Threaded frame capture from a single camera source.
+
+Captured frames are published into a small ring without copying: the
+decoder fills recycled arrays, consumers get read-only views tagged with a
+sequence number and capture time, and a frame array is only decoded into
+again once it has left the ring and no lease holds it.
+"""
+
+import threading
+import time
+from collections import deque
+
+from camera_config import get_camera_index, load_camera_config
+from frame_source import FramePacer, PrefetchReader, open_frame_source
+from profiling import checkpoint
+
+
+class FrameLease:
+    """A published frame kept out of reuse until release(); usable as a context manager"""
+
+    def __init__(self, camera, entry):
+        self.camera = camera
+        self.entry = entry
+        self.frame = entry.view
+        self.seq = entry.seq
+        self.timestamp = entry.timestamp
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.camera._release(self.entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _RingEntry:
+    __slots__ = ('array', 'view', 'seq', 'timestamp', 'leases', 'evicted')
+
+    def __init__(self, array, seq, timestamp):
+        self.array = array
+        self.view = array.view()
+        self.view.flags.writeable = False
+        self.seq = seq
+        self.timestamp = timestamp
+        self.leases = 0
+        self.evicted = False
+
+
+class Camera:
+    """Threaded capture from a device index, video file, image directory or stream URL.
+
+    Recorded sources play at their own frame rate when realtime is True and
+    as fast as they decode otherwise; loop replays them from the start.
+    """
+
+    def __init__(self, camera_index=None, width=None, height=None, fps=None, name=None,
+                 realtime=True, loop=False, prefetch=4, ring_size=4):
+        # Get camera index using the configuration system unless a source is given
+        self.camera_index = get_camera_index() if camera_index is None else camera_index
+        self.name = name or str(self.camera_index)
+
+        print(f"🎥 Attempting to open camera source {self.camera_index}")
+        if width is None or height is None or fps is None:
+            # Load configuration or use defaults
+            config = load_camera_config() or {}
+            width = width or config.get('width', 1280)
+            height = height or config.get('height', 720)
+            fps = fps or config.get('fps', 30)
+        self.source = open_frame_source(self.camera_index, width, height, fps)
+        self.reader = PrefetchReader(self.source, buffer_size=prefetch, loop=loop, name=self.name)
+        self.pacer = FramePacer(self.source.fps) if realtime and not self.source.live else None
+
+        self.condition = threading.Condition()
+        self.ring = deque()
+        self.ring_size = max(2, ring_size)
+        self.frame_seq = 0
+        self.frame_time = 0.0
+        self.fps = 0.0
+        self.running = True
+
+        if self.source.is_opened():
+            kind = 'live' if self.source.live else ('realtime' if self.pacer else 'as fast as possible')
+            print(f"✅ Camera {self.name} opened ({kind}), nominal {self.source.fps:.1f}fps")
+
+            # Test if camera is working; the test frame becomes the first frame
+            test_frame, captured_at = self.reader.read(timeout=5.0)
+            if test_frame is not None:
+                print(f"✅ Camera test successful - Frame size: {test_frame.shape}")
+                self._publish(test_frame, captured_at)
+            else:
+                print("❌ Camera test failed - Cannot read frames")
+        else:
+            print(f"❌ Failed to open camera source {self.camera_index}")
+            print("💡 Try running 'python test_cameras.py' to identify available cameras")
+            print("💡 Or run 'python camera_config.py' for interactive setup")
+
+        self.thread = threading.Thread(target=self._update, args=(), name=f"capture-{self.name}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _publish(self, frame, captured_at):
+        now = time.time()
+        with self.condition:
+            if self.frame_time:
+                # Exponential moving average of the capture rate
+                interval = max(now - self.frame_time, 1e-6)
+                self.fps = 0.9 * self.fps + 0.1 / interval if self.fps else 1.0 / interval
+            self.frame_seq += 1
+            self.frame_time = now
+            self.ring.append(_RingEntry(frame, self.frame_seq, captured_at))
+            while len(self.ring) > self.ring_size:
+                entry = self.ring.popleft()
+                entry.evicted = True
+                if entry.leases == 0:
+                    self.reader.recycle(entry.array)
+            self.condition.notify_all()
+
+    def _release(self, entry):
+        with self.condition:
+            entry.leases -= 1
+            if entry.leases == 0 and entry.evicted:
+                self.reader.recycle(entry.array)
+
+    def _update(self):
+        while self.running:
+            checkpoint()
+            # Blocks on the decoder, so live capture runs at the device's own pace
+            frame, captured_at = self.reader.read(timeout=1.0)
+            if frame is None:
+                if self.reader.exhausted:
+                    if self.source.live:
+                        print(f"Error: Could not read frame from camera {self.name}")
+                    else:
+                        print(f"🏁 Camera {self.name} reached the end of its recording")
+                    self.running = False
+                continue
+            if self.pacer is not None:
+                self.pacer.wait()
+                # Recorded frames are "captured" when they are due
+                captured_at = time.time()
+            self._publish(frame, captured_at)
+        with self.condition:
+            self.condition.notify_all()
+
+    @property
+    def dropped_frames(self):
+        return self.reader.dropped_frames
+
+    def get_frame(self):
+        """Return a private, writable copy of the newest frame"""
+        with self.condition:
+            if not self.ring:
+                return None
+            return self.ring[-1].array.copy()
+
+    def acquire(self, after_seq=0, timeout=None):
+        """Lease the newest frame with a sequence above after_seq, waiting up to timeout.
+
+        Returns a FrameLease, or None on timeout or once capture has stopped.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: not self.running or (self.ring and self.ring[-1].seq > after_seq),
+                                    timeout=timeout)
+            if not self.ring or self.ring[-1].seq <= after_seq:
+                return None
+            entry = self.ring[-1]
+            entry.leases += 1
+            return FrameLease(self, entry)
+
+    def release(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join()
+        self.reader.stop()
@@ -1,23 +1,62 @@
 """
 Camera Configuration Module
 Handles camera selection and configuration for the parking system.
+
+camera_config.json may list several cameras under "cameras", each with its
+own id, camera_index, resolution and optional spot layout:
+
+    {
+      "camera_index": 0, "width": 1280, "height": 720, "fps": 30,
+      "cameras": [
+        {"id": "lot-a", "camera_index": 0},
+        {"id": "entrance", "camera_index": 2, "width": 640, "height": 480,
+         "spots": [{"id": "E1", "x": 100, "y": 200, "width": 140, "height": 75, "section": "E"}]},
+        {"id": "garage", "camera_index": 3, "layout": "layouts/garage.json"},
+        {"id": "replay", "source": "recordings/lot.mp4", "realtime": false, "loop": true}
+      ]
+    }
+
+"source" (or "camera_index") may be a device index, a video file, a
+directory of images or a stream URL such as rtsp://host/stream. Recorded
+sources play at their own frame rate unless "realtime" is false, and
+"loop" replays them. The CAMERA_SOURCE environment variable does the same
+for the single default camera, e.g. CAMERA_SOURCE=recordings/lot.mp4.
+
+Camera probing results are cached in camera_probe_cache.json and reused
+until the device node changes; interactive setup always probes afresh.
+
+"layout" points at a JSON layout file (see ParkingLayout.from_dict) for lots
+with sections, per-spot thresholds or hundreds of spots.
+
+Without "cameras" a single camera called "default" is used.
 """
 
 import os
+import glob
 import json
+import re
+import sys
+import threading
+import time
 import cv2
 
 CONFIG_FILE = "camera_config.json"
+PROBE_CACHE_FILE = "camera_probe_cache.json"
+PROBE_CACHE_TTL = 24 * 3600   # seconds before a cached probe is redone anyway
+PROBE_TIMEOUT = 3.0           # seconds allowed for the whole concurrent scan
+MAX_PROBE_INDEX = 10
 
 def save_camera_config(camera_index, width=1280, height=720, fps=30):
     """Save camera configuration to file"""
-    config = {
+    # Keep any other settings (such as the camera list) already in the file
+    config = load_camera_config() or {}
+    config.update({
         "camera_index": camera_index,
         "width": width,
         "height": height,
         "fps": fps
-    }
-    
+    })
+
     try:
         with open(CONFIG_FILE, 'w') as f:
             json.dump(config, f, indent=2)
@@ -35,15 +74,55 @@ def load_camera_config():
     try:
         with open(CONFIG_FILE, 'r') as f:
             config = json.load(f)
-        print(f"✅ Loaded camera config: Camera {config['camera_index']}")
+        if config.get('cameras'):
+            print(f"✅ Loaded camera config: {len(config['cameras'])} camera(s)")
+        else:
+            print(f"✅ Loaded camera config: Camera {config.get('camera_index')}")
         return config
     except Exception as e:
         print(f"❌ Failed to load camera config: {e}")
         return None
 
+def load_camera_sources():
+    """Return the list of camera definitions to run, one dict per camera"""
+    config = load_camera_config() or {}
+    cameras = config.get('cameras')
+
+    if not cameras:
+        return [{
+            'id': 'default',
+            'camera_index': get_camera_index(),
+            'width': config.get('width', 1280),
+            'height': config.get('height', 720),
+            'fps': config.get('fps', 30),
+            'realtime': config.get('realtime', True),
+            'loop': config.get('loop', False)
+        }]
+
+    sources = []
+    for position, camera in enumerate(cameras):
+        sources.append({
+            'id': str(camera.get('id', position)),
+            'camera_index': camera.get('source', camera.get('camera_index', position)),
+            'width': camera.get('width', config.get('width', 1280)),
+            'height': camera.get('height', config.get('height', 720)),
+            'fps': camera.get('fps', config.get('fps', 30)),
+            'spots': camera.get('spots'),
+            'layout': camera.get('layout'),
+            'realtime': camera.get('realtime', True),
+            'loop': camera.get('loop', False)
+        })
+    return sources
+
 def get_camera_index():
     """Get camera index from various sources in order of priority"""
-    
+
+    # Priority 0: A file, image directory or stream URL to run on instead of a device
+    env_source = os.environ.get('CAMERA_SOURCE')
+    if env_source:
+        print(f"🔧 Using frame source {env_source} from CAMERA_SOURCE environment variable")
+        return env_source
+
     # Priority 1: Environment variable
     env_camera = os.environ.get('CAMERA_INDEX')
     if env_camera is not None:
@@ -56,38 +135,139 @@ def get_camera_index():
     
     # Priority 2: Configuration file
     config = load_camera_config()
-    if config:
+    if config and config.get('camera_index') is not None:
         return config['camera_index']
     
     # Priority 3: Auto-detection
     print("🔍 Auto-detecting cameras...")
     return auto_detect_external_camera()
 
+def list_camera_indices():
+    """Camera indices worth probing: the /dev/video* nodes on Linux, 0-10 elsewhere"""
+    if sys.platform.startswith('linux') and os.path.isdir('/dev'):
+        indices = []
+        for path in glob.glob('/dev/video*'):
+            match = re.fullmatch(r'/dev/video(\d+)', path)
+            if match:
+                indices.append(int(match.group(1)))
+        return sorted(indices)
+    return list(range(MAX_PROBE_INDEX + 1))
+
+def device_signature(camera_index):
+    """Identity of a camera's device node; it changes when the device is re-plugged or swapped"""
+    path = f'/dev/video{camera_index}'
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    name = None
+    try:
+        with open(f'/sys/class/video4linux/video{camera_index}/name', 'r') as f:
+            name = f.read().strip()
+    except OSError:
+        pass
+    return {'inode': stat.st_ino, 'rdev': stat.st_rdev, 'ctime_ns': stat.st_ctime_ns, 'name': name}
+
+def load_probe_cache():
+    try:
+        with open(PROBE_CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_probe_cache(cache):
+    try:
+        with open(PROBE_CACHE_FILE, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"⚠️ Could not write camera probe cache: {e}")
+
+def probe_camera(camera_index):
+    """Open a camera, read one frame and report what it delivers"""
+    cap = cv2.VideoCapture(camera_index)
+    try:
+        if not cap.isOpened():
+            return {'index': camera_index, 'available': False}
+        ret, frame = cap.read()
+        if not ret:
+            return {'index': camera_index, 'available': False}
+        return {
+            'index': camera_index,
+            'available': True,
+            'width': cap.get(cv2.CAP_PROP_FRAME_WIDTH),
+            'height': cap.get(cv2.CAP_PROP_FRAME_HEIGHT),
+            'fps': cap.get(cv2.CAP_PROP_FPS),
+            'backend': cap.getBackendName()
+        }
+    finally:
+        cap.release()
+
+def probe_cameras(indices=None, timeout=PROBE_TIMEOUT, refresh=False):
+    """Probe cameras concurrently and return the available ones, fastest path first.
+
+    Results are cached in PROBE_CACHE_FILE per device and reused while the
+    device node is unchanged and younger than PROBE_CACHE_TTL. Cameras without
+    a device node are always probed, since nothing would tell a stale entry
+    apart. A probe still running after timeout counts as unavailable and is
+    not cached.
+    """
+    enumerated = indices is None
+    indices = list_camera_indices() if enumerated else list(indices)
+    cache = {} if refresh else load_probe_cache()
+    now = time.time()
+    results = {}
+    to_probe = []
+
+    for camera_index in indices:
+        signature = device_signature(camera_index)
+        entry = cache.get(str(camera_index))
+        if (entry and signature is not None and entry.get('signature') == signature
+                and now - entry.get('probed_at', 0) < PROBE_CACHE_TTL):
+            results[camera_index] = entry['result']
+        else:
+            to_probe.append((camera_index, signature))
+
+    if to_probe:
+        # Daemon threads: a driver that hangs in open() cannot hold up the scan or exit
+        probed = {}
+        def run(camera_index):
+            try:
+                probed[camera_index] = probe_camera(camera_index)
+            except Exception as e:
+                print(f"Error probing camera {camera_index}: {e}")
+                probed[camera_index] = {'index': camera_index, 'available': False}
+
+        threads = [threading.Thread(target=run, args=(camera_index,), daemon=True,
+                                    name=f"probe-{camera_index}") for camera_index, _ in to_probe]
+        for thread in threads:
+            thread.start()
+        deadline = time.time() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.time()))
+
+        for camera_index, signature in to_probe:
+            result = probed.get(camera_index)
+            if result is None:
+                print(f"  ⏱️ Camera {camera_index} did not answer within {timeout:g}s")
+                continue
+            results[camera_index] = result
+            if signature is not None:
+                cache[str(camera_index)] = {'signature': signature, 'probed_at': now, 'result': result}
+
+        if enumerated:
+            # Forget devices that no longer exist
+            cache = {key: value for key, value in cache.items() if int(key) in indices}
+        save_probe_cache(cache)
+
+    return [results[index] for index in sorted(results) if results[index].get('available')]
+
 def auto_detect_external_camera():
     """Automatically detect and return the best camera index (prioritizing index 0 if it's external)"""
-    available_cameras = []
-
     print("Scanning for available cameras...")
 
-    # Test camera indices from 0 to 10
-    for camera_index in range(11):
-        cap = cv2.VideoCapture(camera_index)
-        if cap.isOpened():
-            ret, frame = cap.read()
-            if ret:
-                width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-                height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-                fps = cap.get(cv2.CAP_PROP_FPS)
-
-                available_cameras.append({
-                    'index': camera_index,
-                    'width': width,
-                    'height': height,
-                    'fps': fps
-                })
-
-                print(f"  📹 Camera {camera_index}: {width}x{height} @ {fps}fps")
-            cap.release()
+    available_cameras = probe_cameras()
+    for cam in available_cameras:
+        print(f"  📹 Camera {cam['index']}: {cam['width']}x{cam['height']} @ {cam['fps']}fps")
 
     if not available_cameras:
         print("❌ No cameras found!")
@@ -125,22 +305,8 @@ def setup_camera_interactive():
     print("🎥 Interactive Camera Setup")
     print("=" * 40)
     
-    # Scan for cameras
-    available_cameras = []
-    for i in range(11):
-        if test_camera(i):
-            cap = cv2.VideoCapture(i)
-            width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-            height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            cap.release()
-            
-            available_cameras.append({
-                'index': i,
-                'width': width,
-                'height': height,
-                'fps': fps
-            })
+    # Scan for cameras; setup always re-probes so newly plugged devices show up
+    available_cameras = probe_cameras(refresh=True)
     
     if not available_cameras:
         print("❌ No cameras found!")
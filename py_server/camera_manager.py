@@ -0,0 +1,227 @@
+"""
+Camera Manager Module
+Registry of cameras, each with its own capture, detection, event and
+streaming pipeline so one slow camera never stalls the others.
+"""
+
+import os
+import threading
+import time
+
+from ambulance_lane import AmbulanceLane, PriorityGate
+from camera import Camera
+from camera_config import load_camera_sources
+from car_detection import ParkingLayout, default_layout, load_layout
+from detection_pipeline import DetectionWorker
+from detection_pool import DetectionPool
+from event_stream import AmbulanceAlertMonitor
+from motion_gate import MotionGate
+from scheduler import PRIORITY_AMBULANCE, PRIORITY_PARKING, PRIORITY_STREAM, CpuScheduler, default_budget
+from spot_state import EventLog, SpotStateTracker
+from stream_hub import FrameBroadcaster, SnapshotCache
+
+# A camera whose newest frame is older than this is not ready
+READY_MAX_FRAME_AGE = float(os.getenv('READY_MAX_FRAME_AGE', '5.0'))
+
+
+class CameraPipeline:
+    """Capture, detection, debounced state and streaming for one camera"""
+
+    def __init__(self, camera_id, camera, layout, pool=None, scheduler=None):
+        self.id = camera_id
+        self.camera = camera
+        self.layout = layout
+        self.scheduler = scheduler
+
+        # Target rates under the shared CPU budget; PARKING_FPS 0 analyses every new frame
+        self.tasks = []
+        if scheduler is not None:
+            parking_fps = float(os.getenv('PARKING_FPS', '0'))
+            self.tasks = [
+                scheduler.task('ambulance', camera_id, PRIORITY_AMBULANCE,
+                               target_fps=float(os.getenv('AMBULANCE_FPS', '5')),
+                               min_fps=float(os.getenv('AMBULANCE_MIN_FPS', '2'))),
+                scheduler.task('parking', camera_id, PRIORITY_PARKING, target_fps=parking_fps or None,
+                               min_fps=float(os.getenv('PARKING_MIN_FPS', '1'))),
+                scheduler.task('stream', camera_id, PRIORITY_STREAM,
+                               min_fps=float(os.getenv('STREAM_MIN_FPS', '1')))
+            ]
+        ambulance_task, parking_task, stream_task = self.tasks or (None, None, None)
+
+        self.motion_gate = MotionGate(
+            threshold=float(os.getenv('MOTION_GATE_THRESHOLD', '6.0')),
+            max_staleness=float(os.getenv('MOTION_GATE_MAX_STALENESS', '5.0')),
+            layout=layout
+        )
+        self.event_log = EventLog(maxlen=1000)
+        self.spot_tracker = SpotStateTracker(
+            layout.spots, self.event_log,
+            enter_frames=int(os.getenv('SPOT_ENTER_FRAMES', '3')),
+            exit_frames=int(os.getenv('SPOT_EXIT_FRAMES', '5'))
+        )
+
+        # Ambulance passes preempt parking passes on the same camera
+        self.priority_gate = PriorityGate(max_wait=float(os.getenv('AMBULANCE_PREEMPT_MAX_WAIT', '1.0')))
+        self.detector = DetectionWorker(camera, motion_gate=self.motion_gate, layout=layout, pool=pool,
+                                        gate=self.priority_gate, task=parking_task,
+                                        settling=self.spot_tracker.settling)
+        self.ambulance_lane = AmbulanceLane(
+            camera, layout=layout, gate=self.priority_gate,
+            fps=float(os.getenv('AMBULANCE_FPS', '5')),
+            confirm_frames=int(os.getenv('AMBULANCE_CONFIRM_FRAMES', '3')),
+            window=int(os.getenv('AMBULANCE_WINDOW', '5')),
+            clear_frames=int(os.getenv('AMBULANCE_CLEAR_FRAMES', '10')),
+            task=ambulance_task,
+            pool=pool
+        )
+
+        self.ambulance_monitor = AmbulanceAlertMonitor(self.event_log, camera=camera_id)
+        self.detector.add_listener(self.spot_tracker.update)
+        self.ambulance_lane.add_listener(self.ambulance_monitor.update)
+
+        self.broadcaster = FrameBroadcaster(
+            camera, self.detector, layout=layout,
+            max_fps=float(os.getenv('STREAM_MAX_FPS', '30')),
+            default_fps=float(os.getenv('STREAM_DEFAULT_FPS', '10')),
+            stall_timeout=float(os.getenv('STREAM_STALL_TIMEOUT', '10')),
+            task=stream_task
+        )
+        self.snapshots = SnapshotCache(camera, self.broadcaster,
+                                       min_interval=float(os.getenv('SNAPSHOT_MIN_INTERVAL', '0.2')))
+
+    def readiness(self):
+        """Why this camera is or is not ready to serve: producing frames and detector warmed up"""
+        frame_age = time.time() - self.camera.frame_time if self.camera.frame_seq else None
+        return {
+            'running': self.camera.running,
+            'producing_frames': frame_age is not None and frame_age <= READY_MAX_FRAME_AGE,
+            'frame_age': round(frame_age, 3) if frame_age is not None else None,
+            'detector_warmed_up': self.detector.warmed_up and self.ambulance_lane.warmed_up
+        }
+
+    def ready(self):
+        state = self.readiness()
+        return state['running'] and state['producing_frames'] and state['detector_warmed_up']
+
+    def info(self):
+        result = self.detector.latest()
+        return {
+            'id': self.id,
+            'source': self.camera.camera_index,
+            'running': self.camera.running,
+            'ready': self.ready(),
+            'capture_fps': round(self.camera.fps, 2),
+            'dropped_frames': self.camera.dropped_frames,
+            'total_spots': len(self.layout.spots),
+            'viewers': self.broadcaster.subscribers,
+            'last_detection': result.processed_at if result is not None else None,
+            'ambulance_lane': self.ambulance_lane.stats(),
+            **self.detector.stats()
+        }
+
+    def stop(self):
+        self.broadcaster.stop()
+        self.ambulance_lane.stop()
+        self.detector.stop()
+        self.camera.release()
+        for task in self.tasks:
+            self.scheduler.unregister(task)
+
+
+class CameraManager:
+    """Starts one CameraPipeline per configured camera source
+
+    With background=True the constructor returns at once and the cameras are
+    opened on a startup thread, so the server can bind while devices
+    initialise and cascades load; `starting` stays True until every source
+    has been tried.
+    """
+
+    def __init__(self, sources=None, detection_workers=None, background=False):
+        self.pipelines = {}
+        self.failed = {}
+        self.lock = threading.Lock()
+        self.starting = True
+        self.startup_thread = None
+
+        # DETECTION_WORKERS > 0 moves the cascades into that many worker processes
+        if detection_workers is None:
+            detection_workers = int(os.getenv('DETECTION_WORKERS', '0'))
+        self.pool = DetectionPool(detection_workers) if detection_workers > 0 else None
+        self.scheduler = CpuScheduler(budget=default_budget())
+
+        if background:
+            self.startup_thread = threading.Thread(target=self._start_all, args=(sources,), name='camera-startup')
+            self.startup_thread.daemon = True
+            self.startup_thread.start()
+        else:
+            for source in sources if sources is not None else load_camera_sources():
+                self.add(source)
+            self.starting = False
+
+    def _start_all(self, sources):
+        started = time.time()
+        try:
+            if sources is None:
+                sources = load_camera_sources()
+            # Devices open in parallel; a slow or missing one does not hold up the rest
+            threads = [threading.Thread(target=self._add_safely, args=(source,), name=f"camera-open-{source['id']}")
+                       for source in sources]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # Keep the configured order so the first source stays the default camera
+            order = {source['id']: index for index, source in enumerate(sources)}
+            with self.lock:
+                self.pipelines = dict(sorted(self.pipelines.items(), key=lambda item: order.get(item[0], len(order))))
+        except Exception as e:
+            print(f"❌ Camera startup failed: {e}")
+        finally:
+            self.starting = False
+        print(f"📷 Camera startup finished in {time.time() - started:.1f}s: "
+              f"{len(self.pipelines)} started, {len(self.failed)} failed")
+
+    def _add_safely(self, source):
+        try:
+            self.add(source)
+        except Exception as e:
+            print(f"❌ Could not start camera {source['id']}: {e}")
+            with self.lock:
+                self.failed[source['id']] = str(e)
+
+    def add(self, source):
+        camera_id = source['id']
+        spots = source.get('spots')
+        if source.get('layout'):
+            layout = load_layout(source['layout'], name=camera_id)
+        elif spots:
+            layout = ParkingLayout.from_dict({'spots': spots}, name=camera_id)
+        else:
+            layout = default_layout
+        camera = Camera(source['camera_index'], source.get('width'), source.get('height'),
+                        source.get('fps'), name=camera_id,
+                        realtime=source.get('realtime', True), loop=source.get('loop', False))
+        pipeline = CameraPipeline(camera_id, camera, layout, pool=self.pool, scheduler=self.scheduler)
+        with self.lock:
+            self.pipelines[camera_id] = pipeline
+        return pipeline
+
+    def get(self, camera_id=None):
+        """Return the pipeline for camera_id, the first camera when None, or None if unknown"""
+        with self.lock:
+            if camera_id is None:
+                return next(iter(self.pipelines.values()), None)
+            return self.pipelines.get(camera_id)
+
+    def all(self):
+        with self.lock:
+            return list(self.pipelines.values())
+
+    def stop(self):
+        if self.startup_thread is not None:
+            self.startup_thread.join()
+        for pipeline in self.all():
+            pipeline.stop()
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -2,8 +2,10 @@ import cv2
 import json
 import time
 import os
+import threading
 import numpy as np
 
+
 # Configuration constants for consistency
 CAMERA_FEED_WIDTH = 900
 CAMERA_FEED_HEIGHT = 600
@@ -16,34 +18,85 @@ DETECTION_SPOT_HEIGHT = 75   # height in detection coordinates
 SCALE_FACTOR_X = DETECTION_SPOT_WIDTH / UI_SPOT_WIDTH  # ~0.7
 SCALE_FACTOR_Y = DETECTION_SPOT_HEIGHT / UI_SPOT_HEIGHT  # ~0.47
 
+# IoU a detection needs with a spot that sets no threshold of its own
+BASE_IOU_THRESHOLD = 0.2
+
 # Grid-aligned parking layout with consistent sizing and accurate detection zones
 PARKING_SPOTS = [
   # Section A (Left side - A1 to A5) - Grid-aligned with optimized detection zones
-  { "id": 'A1', "x": 110, "y": 190, "width": 140, "height": 75, "section": "A" },
-  { "id": 'A2', "x": 110, "y": 275, "width": 140, "height": 75, "section": "A" },
-  { "id": 'A3', "x": 110, "y": 360, "width": 140, "height": 75, "section": "A" },
-  { "id": 'A4', "x": 110, "y": 445, "width": 140, "height": 75, "section": "A" },
-  { "id": 'A5', "x": 110, "y": 530, "width": 140, "height": 75, "section": "A" },
+  { "id": 'A1', "x": 110, "y": 190, "width": 140, "height": 75, "section": "A", "threshold": 0.18 },
+  { "id": 'A2', "x": 110, "y": 275, "width": 140, "height": 75, "section": "A", "threshold": 0.19 },
+  { "id": 'A3', "x": 110, "y": 360, "width": 140, "height": 75, "section": "A", "threshold": 0.2 },
+  { "id": 'A4', "x": 110, "y": 445, "width": 140, "height": 75, "section": "A", "threshold": 0.19 },
+  { "id": 'A5', "x": 110, "y": 530, "width": 140, "height": 75, "section": "A", "threshold": 0.18 },
   # Section B (Right side - A6 to A10) - Grid-aligned with optimized detection zones
-  { "id": 'A6', "x": 450, "y": 190, "width": 140, "height": 75, "section": "B" },
-  { "id": 'A7', "x": 450, "y": 275, "width": 140, "height": 75, "section": "B" },
-  { "id": 'A8', "x": 450, "y": 360, "width": 140, "height": 75, "section": "B" },
-  { "id": 'A9', "x": 450, "y": 445, "width": 140, "height": 75, "section": "B" },
-  { "id": 'A10', "x": 450, "y": 530, "width": 140, "height": 75, "section": "B" }
+  { "id": 'A6', "x": 450, "y": 190, "width": 140, "height": 75, "section": "B", "threshold": 0.18 },
+  { "id": 'A7', "x": 450, "y": 275, "width": 140, "height": 75, "section": "B", "threshold": 0.19 },
+  { "id": 'A8', "x": 450, "y": 360, "width": 140, "height": 75, "section": "B", "threshold": 0.2 },
+  { "id": 'A9', "x": 450, "y": 445, "width": 140, "height": 75, "section": "B", "threshold": 0.19 },
+  { "id": 'A10', "x": 450, "y": 530, "width": 140, "height": 75, "section": "B", "threshold": 0.18 }
 ]
 
+# Detection is restricted to the padded area around the configured spots.
+# Modes: 'envelope' (union of all spots), 'sections' (one ROI per section) or 'full'
+DETECTION_ROI_MODE = os.environ.get('DETECTION_ROI_MODE', 'envelope')
+DETECTION_ROI_PADDING = 60  # feed pixels around spots so cars overhanging a spot are still found
+
+# Width of the image the cascade runs on; frames are downscaled to it keeping
+# their aspect ratio. 0 runs detection at the native capture resolution.
+DETECTION_WIDTH = int(os.environ.get('DETECTION_WIDTH', '640'))
+
+# Layouts with at least this many spots match detections through a uniform
+# grid over the spots instead of the dense spots x detections IoU matrix
+SPATIAL_INDEX_MIN_SPOTS = 64
+
+# Cascade search window relative to spot size (30-200px for the 140x75 spots)
+MIN_CAR_SCALE = 0.4   # of the smaller spot side
+MAX_CAR_SCALE = 1.43  # of the larger spot side
+MIN_CAR_SIZE = 12     # never search below this many pixels
+
+# The built-in layout searches for ambulances in the central driving lane
+# drawn by draw_driving_lane_grid (x1, y1, x2, y2 in feed coordinates), padded
+# so a vehicle straddling the lane edge is still found. Other layouts search
+# the whole frame unless they set their own "ambulance_roi".
+AMBULANCE_ROI = (270, 320, 430, 420)
+AMBULANCE_ROI_PADDING = 40
+AMBULANCE_MIN_SIZE = (40, 24)  # feed pixels; the maximum is the ROI itself
+
 script_dir = os.path.dirname(os.path.abspath(__file__))
 car_cascade_path = os.path.join(script_dir, 'cars.xml')
 ambulance_cascade_path = os.path.join(script_dir, 'ambulance.xml')
 
-print(f"Loading car cascade from: {car_cascade_path}")
-print(f"Car cascade file exists: {os.path.exists(car_cascade_path)}")
-
-car_cascade = cv2.CascadeClassifier(car_cascade_path)
-ambulance_cascade = cv2.CascadeClassifier(ambulance_cascade_path)
-
-print(f"Car cascade loaded successfully: {not car_cascade.empty()}")
-print(f"Ambulance cascade loaded successfully: {not ambulance_cascade.empty()}")
+# CascadeClassifier is not safe to share between threads, so every detection
+# thread (one per camera pipeline) gets its own copy, loaded on first use
+_thread_cascades = threading.local()
+_cascade_lock = threading.Lock()
+_cascade_status = None
+
+def load_cascades():
+    """Load the cascades on first use and return {'car': usable, 'ambulance': usable}"""
+    global _cascade_status
+    with _cascade_lock:
+        if _cascade_status is None:
+            print(f"Loading car cascade from: {car_cascade_path}")
+            print(f"Car cascade file exists: {os.path.exists(car_cascade_path)}")
+            _cascade_status = {
+                'car': not get_car_cascade().empty(),
+                'ambulance': not get_ambulance_cascade().empty()
+            }
+            print(f"Car cascade loaded successfully: {_cascade_status['car']}")
+            print(f"Ambulance cascade loaded successfully: {_cascade_status['ambulance']}")
+    return _cascade_status
+
+def get_car_cascade():
+    if not hasattr(_thread_cascades, 'car'):
+        _thread_cascades.car = cv2.CascadeClassifier(car_cascade_path)
+    return _thread_cascades.car
+
+def get_ambulance_cascade():
+    if not hasattr(_thread_cascades, 'ambulance'):
+        _thread_cascades.ambulance = cv2.CascadeClassifier(ambulance_cascade_path)
+    return _thread_cascades.ambulance
 
 # Run system verification on module load
 if __name__ == "__main__":
@@ -61,73 +114,432 @@ def calculate_iou(boxA, boxB):
     iou = interArea / float(boxAArea + boxBArea - interArea) if (boxAArea + boxBArea - interArea) != 0 else 0
     return iou
 
-def get_parking_status(frame):
+def get_parking_status(frame, layout=None):
     """Enhanced parking status detection with improved accuracy and consistency"""
+    return analyze_parking(frame, layout)['occupied_spots']
+
+def analyze_parking(frame, layout=None):
+    """Run car detection on a frame and return occupied spots, confidences and raw boxes.
+
+    'timings' holds the seconds spent per stage, for the caller to record: in
+    a detection pool this runs in a worker process, whose metrics nobody scrapes.
+    """
+    layout = layout or default_layout
     try:
         # Check if cascade is loaded
-        if car_cascade.empty():
+        if not load_cascades()['car']:
             print("Error: Car cascade classifier not loaded.")
-            return []
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        # Apply preprocessing for better detection
-        gray = cv2.equalizeHist(gray)  # Improve contrast
-        gray = cv2.GaussianBlur(gray, (3, 3), 0)  # Reduce noise
+            return {'occupied_spots': [], 'confidences': {}, 'cars': [], 'spot_cars': {}}
+
+        # Detect cars inside the spot ROIs only, in detection coordinates
+        detection_size = get_detection_size(frame.shape)
+        timings = {'preprocess': 0.0, 'cascade': 0.0}
+        cars = detect_cars(frame, detection_size, layout, timings)
+
+        # Match spots against detections, through the spatial index for large lots
+        started = time.perf_counter()
+        spot_boxes, thresholds = layout.spot_arrays(detection_size)
+        if len(spot_boxes) >= SPATIAL_INDEX_MIN_SPOTS:
+            best_match, best_iou, occupied = assign_detections_indexed(
+                cars, thresholds, layout.spot_index(detection_size))
+        else:
+            best_match, best_iou, occupied = assign_detections(cars, spot_boxes, thresholds)
+        timings['assignment'] = time.perf_counter() - started
 
-        # Detect cars with optimized parameters
-        cars = car_cascade.detectMultiScale(gray, 1.05, 5, minSize=(30, 30), maxSize=(200, 200))
+        # Report boxes in the same feed coordinates as the spots
+        cars = layout.map_boxes_to_feed(cars, detection_size)
 
         occupied_spots = []
         detection_confidence = {}
-
-        for spot in PARKING_SPOTS:
-            spot_id = spot['id']
-            is_occupied = False
-            max_iou = 0
-            best_detection = None
-
-            # Check all detected cars for this spot
-            for (x, y, w, h) in cars:
-                car_box = [x, y, x + w, y + h]
-                spot_box = [spot['x'], spot['y'], spot['x'] + spot['width'], spot['y'] + spot['height']]
-                iou = calculate_iou(car_box, spot_box)
-
-                # Use adaptive threshold based on spot size and position
-                threshold = get_adaptive_threshold(spot)
-
-                if iou > threshold and iou > max_iou:
-                    max_iou = iou
-                    best_detection = (x, y, w, h)
-                    is_occupied = True
-
-            if is_occupied:
-                occupied_spots.append(spot_id)
-                detection_confidence[spot_id] = max_iou
+        spot_cars = {}
+        for index in np.flatnonzero(occupied):
+            spot_id = layout.spots[index]['id']
+            occupied_spots.append(spot_id)
+            detection_confidence[spot_id] = float(best_iou[index])
+            spot_cars[spot_id] = cars[best_match[index]]
 
         # Validate detection consistency
         validated_spots = validate_detection_consistency(occupied_spots, detection_confidence)
 
-        return validated_spots
+        return {
+            'occupied_spots': validated_spots,
+            'confidences': {spot_id: detection_confidence[spot_id] for spot_id in validated_spots},
+            'cars': cars,
+            'spot_cars': {spot_id: spot_cars[spot_id] for spot_id in validated_spots},
+            'timings': timings
+        }
 
     except Exception as e:
         print(f"Error in get_parking_status: {e}")
         import traceback
         traceback.print_exc()
-        return []
+        return {'occupied_spots': [], 'confidences': {}, 'cars': [], 'spot_cars': {}}
+
+def get_spot_envelope(spots, padding, frame_width, frame_height):
+    """Return the padded bounding box (x1, y1, x2, y2) around spots, clipped to the frame"""
+    pad_x, pad_y = padding if isinstance(padding, tuple) else (padding, padding)
+    x1 = max(0, min(spot['x'] for spot in spots) - pad_x)
+    y1 = max(0, min(spot['y'] for spot in spots) - pad_y)
+    x2 = min(frame_width, max(spot['x'] + spot['width'] for spot in spots) + pad_x)
+    y2 = min(frame_height, max(spot['y'] + spot['height'] for spot in spots) + pad_y)
+    return (x1, y1, x2, y2)
+
+_layout_counter = 0
+
+class ParkingLayout:
+    """A set of parking spots in feed coordinates plus the geometry caches derived from it"""
+
+    def __init__(self, spots, feed_width=CAMERA_FEED_WIDTH, feed_height=CAMERA_FEED_HEIGHT,
+                 name='default', static_overlay=False, ambulance_roi=None):
+        self.spots = spots
+        self.feed_width = feed_width
+        self.feed_height = feed_height
+        self.name = name
+        self.static_overlay = static_overlay  # draw the built-in section/lane graphics
+        self.ambulance_roi = tuple(ambulance_roi) if ambulance_roi else None  # None searches the whole frame
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop cached geometry after the spots change"""
+        global _layout_counter
+        _layout_counter += 1
+        self.version = _layout_counter
+        self._roi_cache = {}
+        self._spot_arrays = {}
+        self._spot_index = {}
+        self._scaled_spots = {}
+
+    def feed_scale(self, size):
+        """Scale factors (sx, sy) from feed coordinates to an image of the given (width, height)"""
+        return size[0] / self.feed_width, size[1] / self.feed_height
+
+    def scaled_spots(self, size=None):
+        """Spots mapped from feed coordinates into an image of the given (width, height)"""
+        if size is None:
+            return self.spots
+        size = tuple(size)
+        if size not in self._scaled_spots:
+            sx, sy = self.feed_scale(size)
+            self._scaled_spots[size] = [
+                dict(spot,
+                     x=int(round(spot['x'] * sx)),
+                     y=int(round(spot['y'] * sy)),
+                     width=max(1, int(round(spot['width'] * sx))),
+                     height=max(1, int(round(spot['height'] * sy))))
+                for spot in self.spots
+            ]
+        return self._scaled_spots[size]
+
+    def map_boxes_to_feed(self, boxes, size):
+        """Map (x, y, w, h) boxes from an image of the given (width, height) back to feed coordinates"""
+        sx, sy = self.feed_scale(size)
+        if sx == 1 and sy == 1:
+            return list(boxes)
+        return [(int(round(x / sx)), int(round(y / sy)), int(round(w / sx)), int(round(h / sy)))
+                for (x, y, w, h) in boxes]
+
+    def ambulance_search_area(self, size):
+        """Padded ambulance ROI as (x1, y1, x2, y2) in an image of the given (width, height)"""
+        if self.ambulance_roi is None:
+            return 0, 0, size[0], size[1]
+        sx, sy = self.feed_scale(size)
+        x1, y1, x2, y2 = self.ambulance_roi
+        return (max(0, int((x1 - AMBULANCE_ROI_PADDING) * sx)), max(0, int((y1 - AMBULANCE_ROI_PADDING) * sy)),
+                min(size[0], int((x2 + AMBULANCE_ROI_PADDING) * sx)), min(size[1], int((y2 + AMBULANCE_ROI_PADDING) * sy)))
+
+    def car_size_range(self, size=None):
+        """Derive the cascade minSize/maxSize from the spot dimensions at the given size"""
+        spots = self.scaled_spots(size)
+        if not spots:
+            return (30, 30), (200, 200)
+        min_side = max(MIN_CAR_SIZE, int(min(min(spot['width'], spot['height']) for spot in spots) * MIN_CAR_SCALE))
+        max_side = max(min_side + 1, int(max(max(spot['width'], spot['height']) for spot in spots) * MAX_CAR_SCALE))
+        return (min_side, min_side), (max_side, max_side)
+
+    def spot_arrays(self, size=None):
+        """Return (spot boxes as Nx4 [x1, y1, x2, y2], per-spot IoU thresholds), built once per layout.
+
+        Boxes are in feed coordinates, or mapped into an image of the given (width, height).
+        """
+        key = tuple(size) if size is not None else None
+        if key not in self._spot_arrays:
+            spots = self.scaled_spots(size)
+            spot_boxes = np.array(
+                [[spot['x'], spot['y'], spot['x'] + spot['width'], spot['y'] + spot['height']] for spot in spots],
+                dtype=np.int64
+            ).reshape(-1, 4)
+            thresholds = np.array([get_adaptive_threshold(spot) for spot in self.spots], dtype=np.float64)
+            self._spot_arrays[key] = (spot_boxes, thresholds)
+        return self._spot_arrays[key]
+
+    def spot_index(self, size=None):
+        """Uniform grid over the spot boxes at the given size, built once per layout"""
+        key = tuple(size) if size is not None else None
+        if key not in self._spot_index:
+            self._spot_index[key] = SpotGrid(self.spot_arrays(size)[0])
+        return self._spot_index[key]
+
+    def detection_rois(self, frame_shape, mode=None, padding=DETECTION_ROI_PADDING):
+        """Get the regions of a detection-sized frame the car cascade should scan"""
+        mode = mode or DETECTION_ROI_MODE
+        frame_height, frame_width = frame_shape[:2]
+        key = (frame_width, frame_height, mode, padding)
+        if key in self._roi_cache:
+            return self._roi_cache[key]
+
+        spots = self.scaled_spots((frame_width, frame_height))
+        sx, sy = self.feed_scale((frame_width, frame_height))
+        scaled_padding = (int(round(padding * sx)), int(round(padding * sy)))
+
+        if mode == 'full' or not spots:
+            rois = [(0, 0, frame_width, frame_height)]
+        elif mode == 'sections':
+            sections = {}
+            for spot in spots:
+                sections.setdefault(spot.get('section', ''), []).append(spot)
+            rois = [get_spot_envelope(section_spots, scaled_padding, frame_width, frame_height)
+                    for section_spots in sections.values()]
+        else:
+            rois = [get_spot_envelope(spots, scaled_padding, frame_width, frame_height)]
+
+        # Drop ROIs that fall completely outside the frame
+        rois = [roi for roi in rois if roi[2] > roi[0] and roi[3] > roi[1]]
+        self._roi_cache[key] = rois
+        return rois
+
+    @classmethod
+    def from_dict(cls, data, name=None):
+        """Build a layout from its JSON form.
+
+        Spots may be listed flat under "spots" (each with a "section") or
+        grouped under "sections": [{"id": "A", "threshold": 0.2, "spots": [...]}].
+        A section threshold applies to its spots unless a spot sets its own.
+        "ambulance_roi" is [x1, y1, x2, y2]; without one the whole frame is searched.
+        """
+        spots = [dict(spot) for spot in data.get('spots', [])]
+        for section in data.get('sections', []):
+            for spot in section.get('spots', []):
+                spot = dict(spot)
+                spot.setdefault('section', section.get('id', ''))
+                if 'threshold' in section:
+                    spot.setdefault('threshold', section['threshold'])
+                spots.append(spot)
+
+        seen = set()
+        for spot in spots:
+            for field in ('id', 'x', 'y', 'width', 'height'):
+                if field not in spot:
+                    raise ValueError(f"Spot {spot.get('id', '?')} is missing '{field}'")
+            if spot['id'] in seen:
+                raise ValueError(f"Duplicate spot id: {spot['id']}")
+            seen.add(spot['id'])
+            spot.setdefault('section', '')
+
+        return cls(spots,
+                   feed_width=data.get('feed_width', CAMERA_FEED_WIDTH),
+                   feed_height=data.get('feed_height', CAMERA_FEED_HEIGHT),
+                   name=name or data.get('name', 'default'),
+                   static_overlay=data.get('static_overlay', False),
+                   ambulance_roi=data.get('ambulance_roi'))
+
+def load_layout(path, name=None):
+    """Load a ParkingLayout from a JSON file; relative paths resolve against this directory"""
+    if not os.path.isabs(path):
+        path = os.path.join(script_dir, path)
+    with open(path, 'r') as f:
+        data = json.load(f)
+    layout = ParkingLayout.from_dict(data, name=name)
+    print(f"✅ Loaded parking layout '{layout.name}' with {len(layout.spots)} spots from {path}")
+    return layout
+
+class SpotGrid:
+    """Uniform grid spatial index over [x1, y1, x2, y2] spot boxes.
+
+    Cells are stored CSR-style: the spots of cell c are
+    spot_ids[offsets[c]:offsets[c + 1]], so candidate lookups stay in NumPy.
+    """
+
+    def __init__(self, spot_boxes, cell_size=None):
+        self.spot_boxes = spot_boxes
+        if cell_size is None:
+            # Cells about twice the typical spot size keep candidate lists short
+            sizes = np.concatenate([spot_boxes[:, 2] - spot_boxes[:, 0], spot_boxes[:, 3] - spot_boxes[:, 1]])
+            cell_size = int(max(8, np.median(sizes) * 2)) if len(sizes) else 64
+        self.cell_size = cell_size
+
+        cx1, cy1, cx2, cy2 = self._cell_ranges(spot_boxes)
+        self.cols = int(cx2.max()) + 1 if len(spot_boxes) else 1
+        self.rows = int(cy2.max()) + 1 if len(spot_boxes) else 1
+        cells, spots = self._pairs(cx1, cy1, cx2, cy2)
+        order = np.argsort(cells, kind='stable')
+        self.spot_ids = spots[order]
+        self.offsets = np.zeros(self.cols * self.rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.cols * self.rows), out=self.offsets[1:])
+
+    def _cell_ranges(self, boxes):
+        cs = self.cell_size
+        x1 = np.maximum(boxes[:, 0], 0)
+        y1 = np.maximum(boxes[:, 1], 0)
+        return (x1 // cs, y1 // cs,
+                np.maximum(x1, boxes[:, 2] - 1) // cs, np.maximum(y1, boxes[:, 3] - 1) // cs)
+
+    def _pairs(self, cx1, cy1, cx2, cy2):
+        """(cell id, box index) for every grid cell each box touches"""
+        cells, owners = [], []
+        if len(cx1):
+            for dx in range(int((cx2 - cx1).max()) + 1):
+                for dy in range(int((cy2 - cy1).max()) + 1):
+                    valid = (cx1 + dx <= cx2) & (cy1 + dy <= cy2)
+                    cells.append(((cy1 + dy) * self.cols + cx1 + dx)[valid])
+                    owners.append(np.flatnonzero(valid))
+        if not cells:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(cells), np.concatenate(owners)
+
+    def candidate_pairs(self, boxes):
+        """(box index, spot index) pairs that share a grid cell, a superset of the overlapping pairs"""
+        cx1, cy1, cx2, cy2 = self._cell_ranges(boxes)
+        # Cells past the grid hold no spots
+        cx2 = np.minimum(cx2, self.cols - 1)
+        cy2 = np.minimum(cy2, self.rows - 1)
+        cells, owners = self._pairs(cx1, cy1, cx2, cy2)
+        starts = self.offsets[cells]
+        counts = self.offsets[cells + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        # Expand every (box, cell) pair into the cell's spot list
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(owners, counts), self.spot_ids[np.repeat(starts, counts) + within]
+
+default_layout = ParkingLayout(PARKING_SPOTS, static_overlay=True, ambulance_roi=AMBULANCE_ROI)
+
+def get_detection_size(frame_shape):
+    """Return the (width, height) the cascade runs at for a frame of this shape"""
+    frame_height, frame_width = frame_shape[:2]
+    if not DETECTION_WIDTH or DETECTION_WIDTH >= frame_width:
+        return (frame_width, frame_height)
+    return (DETECTION_WIDTH, max(1, round(frame_height * DETECTION_WIDTH / frame_width)))
+
+def calculate_iou_matrix(spot_boxes, car_boxes):
+    """Vectorized calculate_iou for every spot x car pair; boxes are [x1, y1, x2, y2]"""
+    xA = np.maximum(spot_boxes[:, None, 0], car_boxes[None, :, 0])
+    yA = np.maximum(spot_boxes[:, None, 1], car_boxes[None, :, 1])
+    xB = np.minimum(spot_boxes[:, None, 2], car_boxes[None, :, 2])
+    yB = np.minimum(spot_boxes[:, None, 3], car_boxes[None, :, 3])
+
+    interArea = np.maximum(0, xB - xA) * np.maximum(0, yB - yA)
+    spotArea = (spot_boxes[:, 2] - spot_boxes[:, 0]) * (spot_boxes[:, 3] - spot_boxes[:, 1])
+    carArea = (car_boxes[:, 2] - car_boxes[:, 0]) * (car_boxes[:, 3] - car_boxes[:, 1])
+    union = spotArea[:, None] + carArea[None, :] - interArea
+
+    iou = np.zeros(union.shape, dtype=np.float64)
+    np.divide(interArea, union, out=iou, where=union != 0)
+    return iou
+
+def assign_detections(cars, spot_boxes, thresholds):
+    """Find the best matching detection per spot.
+
+    Returns (best car index, best IoU, occupied mask), one entry per spot.
+    A spot is occupied when its best IoU exceeds its threshold; ties keep the
+    first detection, matching the original per-spot loop.
+    """
+    num_spots = len(spot_boxes)
+    if num_spots == 0 or len(cars) == 0:
+        return (np.full(num_spots, -1, dtype=np.int64), np.zeros(num_spots),
+                np.zeros(num_spots, dtype=bool))
+
+    car_boxes = np.asarray(cars, dtype=np.int64).reshape(-1, 4).copy()
+    car_boxes[:, 2] += car_boxes[:, 0]
+    car_boxes[:, 3] += car_boxes[:, 1]
+
+    iou = calculate_iou_matrix(spot_boxes, car_boxes)
+    iou[iou <= thresholds[:, None]] = 0
+
+    best_match = np.argmax(iou, axis=1)
+    best_iou = iou[np.arange(num_spots), best_match]
+    occupied = best_iou > 0
+    best_match[~occupied] = -1
+    return best_match, best_iou, occupied
+
+def detect_cars(frame, detection_size=None, layout=None, timings=None):
+    """Run the car cascade over the detection ROIs.
+
+    The frame is first downscaled to detection_size; boxes are returned in
+    that detection coordinate space. Preprocessing and cascade seconds are
+    added to timings when a dict is given.
+    """
+    layout = layout or default_layout
+    detection_size = detection_size or get_detection_size(frame.shape)
+    if (frame.shape[1], frame.shape[0]) != tuple(detection_size):
+        frame = cv2.resize(frame, detection_size, interpolation=cv2.INTER_AREA)
+    min_size, max_size = layout.car_size_range(detection_size)
+
+    cars = []
+    preprocess_time = cascade_time = 0.0
+    for (x1, y1, x2, y2) in layout.detection_rois(frame.shape):
+        started = time.perf_counter()
+        gray = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+
+        # Apply preprocessing for better detection
+        gray = cv2.equalizeHist(gray)  # Improve contrast
+        gray = cv2.GaussianBlur(gray, (3, 3), 0)  # Reduce noise
+        preprocessed = time.perf_counter()
+
+        # Detect cars with the search window bounded by the spot sizes
+        found = get_car_cascade().detectMultiScale(gray, 1.05, 5, minSize=min_size, maxSize=max_size)
+        preprocess_time += preprocessed - started
+        cascade_time += time.perf_counter() - preprocessed
+
+        # Map ROI-relative boxes back to detection-frame coordinates
+        for (x, y, w, h) in found:
+            cars.append((int(x) + x1, int(y) + y1, int(w), int(h)))
+    if timings is not None:
+        timings['preprocess'] = timings.get('preprocess', 0.0) + preprocess_time
+        timings['cascade'] = timings.get('cascade', 0.0) + cascade_time
+    return cars
+
+def assign_detections_indexed(cars, thresholds, spot_grid):
+    """assign_detections for large layouts: IoU is only computed for spot/detection pairs sharing a grid cell"""
+    spot_boxes = spot_grid.spot_boxes
+    num_spots = len(spot_boxes)
+    best_match = np.full(num_spots, -1, dtype=np.int64)
+    best_iou = np.zeros(num_spots)
+    if num_spots == 0 or len(cars) == 0:
+        return best_match, best_iou, np.zeros(num_spots, dtype=bool)
+
+    car_boxes = np.asarray(cars, dtype=np.int64).reshape(-1, 4).copy()
+    car_boxes[:, 2] += car_boxes[:, 0]
+    car_boxes[:, 3] += car_boxes[:, 1]
+
+    car_ids, spot_ids = spot_grid.candidate_pairs(car_boxes)
+    if len(car_ids):
+        s, c = spot_boxes[spot_ids], car_boxes[car_ids]
+        interArea = (np.maximum(0, np.minimum(s[:, 2], c[:, 2]) - np.maximum(s[:, 0], c[:, 0])) *
+                     np.maximum(0, np.minimum(s[:, 3], c[:, 3]) - np.maximum(s[:, 1], c[:, 1])))
+        union = ((s[:, 2] - s[:, 0]) * (s[:, 3] - s[:, 1]) +
+                 (c[:, 2] - c[:, 0]) * (c[:, 3] - c[:, 1]) - interArea)
+        iou = np.zeros(len(union), dtype=np.float64)
+        np.divide(interArea, union, out=iou, where=union != 0)
+
+        keep = iou > thresholds[spot_ids]
+        spot_ids, car_ids, iou = spot_ids[keep], car_ids[keep], iou[keep]
+        # Per spot, highest IoU first and the earliest detection on ties
+        order = np.lexsort((car_ids, -iou, spot_ids))
+        spot_ids, car_ids, iou = spot_ids[order], car_ids[order], iou[order]
+        first = np.ones(len(spot_ids), dtype=bool)
+        first[1:] = spot_ids[1:] != spot_ids[:-1]
+        best_match[spot_ids[first]] = car_ids[first]
+        best_iou[spot_ids[first]] = iou[first]
+
+    occupied = best_match >= 0
+    return best_match, best_iou, occupied
 
 def get_adaptive_threshold(spot):
-    """Get adaptive IoU threshold based on spot characteristics"""
-    # Base threshold
-    base_threshold = 0.2
-
-    # Adjust based on spot position (edge spots might need lower threshold)
-    if spot['id'] in ['A1', 'A5', 'A6', 'A10']:  # Corner spots
-        return base_threshold * 0.9
-    elif spot['id'] in ['A2', 'A4', 'A7', 'A9']:  # Edge spots
-        return base_threshold * 0.95
-    else:  # Center spots
-        return base_threshold
+    """IoU threshold for a spot: its own (or its section's) value, else the base threshold"""
+    if 'threshold' in spot:
+        return float(spot['threshold'])
+    return BASE_IOU_THRESHOLD
 
 def validate_detection_consistency(occupied_spots, detection_confidence):
     """Validate detection results for consistency across all spots"""
@@ -142,47 +554,71 @@ def validate_detection_consistency(occupied_spots, detection_confidence):
 
     return validated_spots
 
-def detect_ambulance(frame):
-    if ambulance_cascade.empty():
-        print("Error: Ambulance cascade classifier not loaded.")
-        return False
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    ambulances = ambulance_cascade.detectMultiScale(gray, 1.05, 3)
-    return len(ambulances) > 0
-
-def generate_frames(camera):
-    while True:
-        frame = camera.get_frame()
-        if frame is None:
-            break
-
-        occupied_spots = get_parking_status(frame)
-
-        # Draw enhanced parking overlay with visual improvements
-        draw_enhanced_parking_overlay(frame, occupied_spots)
+def find_ambulances(frame, layout=None, min_neighbors=3):
+    """Ambulances inside the layout's ambulance ROI as (x, y, w, h, confidence) in feed coordinates.
 
-        (flag, encodedImage) = cv2.imencode(".jpg", frame)
-        if not flag:
-            continue
+    Confidence is the share of overlapping raw cascade hits behind a box,
+    saturating at twice min_neighbors.
+    """
+    layout = layout or default_layout
+    if not load_cascades()['ambulance']:
+        print("Error: Ambulance cascade classifier not loaded.")
+        return []
 
-        yield(b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' +
-              bytearray(encodedImage) + b'\r\n')
-        time.sleep(0.1) # sleep for 100ms
+    frame_size = (frame.shape[1], frame.shape[0])
+    x1, y1, x2, y2 = layout.ambulance_search_area(frame_size)
+    if x2 <= x1 or y2 <= y1:
+        return []
 
-def draw_enhanced_parking_overlay(frame, occupied_spots):
+    # Crop first, then shrink to the detection resolution
+    crop = frame[y1:y2, x1:x2]
+    scale = get_detection_size(frame.shape)[0] / frame_size[0]
+    if scale < 1:
+        crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+
+    sx, sy = layout.feed_scale(frame_size)
+    min_size = (max(MIN_CAR_SIZE, int(AMBULANCE_MIN_SIZE[0] * sx * scale)),
+                max(MIN_CAR_SIZE, int(AMBULANCE_MIN_SIZE[1] * sy * scale)))
+    max_size = (gray.shape[1], gray.shape[0])
+    if min_size[0] > max_size[0] or min_size[1] > max_size[1]:
+        return []
+    boxes, neighbours = get_ambulance_cascade().detectMultiScale2(
+        gray, scaleFactor=1.05, minNeighbors=min_neighbors, minSize=min_size, maxSize=max_size)
+
+    ambulances = []
+    for (x, y, w, h), count in zip(boxes, neighbours):
+        ambulances.append((int(round((x / scale + x1) / sx)), int(round((y / scale + y1) / sy)),
+                           int(round(w / scale / sx)), int(round(h / scale / sy)),
+                           round(min(1.0, float(count) / (2.0 * min_neighbors)), 3)))
+    return ambulances
+
+def detect_ambulance(frame, layout=None):
+    return len(find_ambulances(frame, layout)) > 0
+
+def resize_to_feed(frame, layout=None):
+    """Resize a captured frame to the feed resolution the overlay and spots are authored in"""
+    layout = layout or default_layout
+    if frame.shape[1] == layout.feed_width and frame.shape[0] == layout.feed_height:
+        return frame
+    return cv2.resize(frame, (layout.feed_width, layout.feed_height), interpolation=cv2.INTER_AREA)
+
+def draw_enhanced_parking_overlay(frame, occupied_spots, layout=None):
     """Draw enhanced grid-based parking overlay with structured layout and improved visuals"""
+    layout = layout or default_layout
 
-    # Draw background grid structure
-    draw_parking_grid_background(frame)
+    if layout.static_overlay:
+        # Draw background grid structure
+        draw_parking_grid_background(frame)
 
-    # Draw section headers with enhanced styling
-    draw_section_headers(frame)
+        # Draw section headers with enhanced styling
+        draw_section_headers(frame)
 
-    # Draw central driving lane with grid integration
-    draw_driving_lane_grid(frame)
+        # Draw central driving lane with grid integration
+        draw_driving_lane_grid(frame)
 
     # Draw enhanced parking spots with grid-based layout
-    draw_grid_parking_spots(frame, occupied_spots)
+    draw_grid_parking_spots(frame, occupied_spots, layout)
 
 def draw_parking_grid_background(frame):
     """Draw the background grid structure for the parking layout"""
@@ -242,81 +678,85 @@ def draw_driving_lane_grid(frame):
         cv2.fillPoly(frame, [pts], (255, 255, 255))
         cv2.polylines(frame, [pts], True, (200, 200, 200), 2)
 
-def draw_grid_parking_spots(frame, occupied_spots):
+def draw_grid_parking_spots(frame, occupied_spots, layout=None):
     """Draw parking spots with grid-based enhanced visualization"""
-    for spot in PARKING_SPOTS:
-        x, y, w, h = spot['x'], spot['y'], spot['width'], spot['height']
-        spot_id = spot['id']
-
-        # Determine spot colors and styling
-        if spot_id in occupied_spots:
-            # Occupied spot - red with grid styling
-            primary_color = (0, 0, 255)  # Red
-            fill_color = (0, 0, 180)     # Darker red
-            accent_color = (0, 0, 220)   # Medium red
-            status_text = "OCCUPIED"
-        else:
-            # Available spot - green with grid styling
-            primary_color = (0, 255, 0)  # Green
-            fill_color = (0, 180, 0)     # Darker green
-            accent_color = (0, 220, 0)   # Medium green
-            status_text = "AVAILABLE"
-
-        # Draw grid-style spot background
-        cv2.rectangle(frame, (x, y), (x + w, y + h), fill_color, -1)  # Fill
-
-        # Draw grid pattern within spot
-        grid_spacing = 15
-        for gx in range(x + grid_spacing, x + w, grid_spacing):
-            cv2.line(frame, (gx, y), (gx, y + h), accent_color, 1)
-        for gy in range(y + grid_spacing, y + h, grid_spacing):
-            cv2.line(frame, (x, gy), (x + w, gy), accent_color, 1)
-
-        # Draw spot border with enhanced styling
-        cv2.rectangle(frame, (x, y), (x + w, y + h), primary_color, 3)
-        cv2.rectangle(frame, (x-1, y-1), (x + w + 1, y + h + 1), (255, 255, 255), 1)  # White outline
-
-        # Draw spot ID with background
-        id_bg_x1, id_bg_y1 = x + 2, y + 2
-        id_bg_x2, id_bg_y2 = x + 35, y + 20
-        cv2.rectangle(frame, (id_bg_x1, id_bg_y1), (id_bg_x2, id_bg_y2), (0, 0, 0), -1)
-        cv2.rectangle(frame, (id_bg_x1, id_bg_y1), (id_bg_x2, id_bg_y2), primary_color, 2)
-        cv2.putText(frame, spot_id, (x + 5, y + 16), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-
-        # Draw enhanced status indicators
-        if spot_id in occupied_spots:
-            # Draw car icon with grid styling
-            car_center_x = x + w // 2
-            car_center_y = y + h // 2
-
-            # Car body
-            cv2.ellipse(frame, (car_center_x, car_center_y), (30, 15), 0, 0, 360, (255, 255, 255), -1)
-            cv2.ellipse(frame, (car_center_x, car_center_y), (30, 15), 0, 0, 360, primary_color, 2)
-
-            # Car details
-            cv2.ellipse(frame, (car_center_x - 10, car_center_y), (8, 6), 0, 0, 360, (200, 200, 200), -1)
-            cv2.ellipse(frame, (car_center_x + 10, car_center_y), (8, 6), 0, 0, 360, (200, 200, 200), -1)
-
-            # Occupied indicator
-            cv2.circle(frame, (x + w - 10, y + 10), 5, (255, 0, 0), -1)
-            cv2.circle(frame, (x + w - 10, y + 10), 5, (255, 255, 255), 2)
-        else:
-            # Available indicator with grid pattern
-            cv2.circle(frame, (x + w - 10, y + 10), 5, (0, 255, 0), -1)
-            cv2.circle(frame, (x + w - 10, y + 10), 5, (255, 255, 255), 2)
-
-            # Draw parking lines
-            line_y = y + h - 15
-            cv2.line(frame, (x + 10, line_y), (x + w - 10, line_y), (255, 255, 255), 2)
-
-        # Draw status text with background
-        text_size = cv2.getTextSize(status_text, cv2.FONT_HERSHEY_SIMPLEX, 0.4, 1)[0]
-        text_x = x + (w - text_size[0]) // 2
-        text_y = y + h - 5
-
-        # Text background
-        cv2.rectangle(frame, (text_x - 2, text_y - 12), (text_x + text_size[0] + 2, text_y + 2), (0, 0, 0), -1)
-        cv2.putText(frame, status_text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+    for spot in (layout or default_layout).spots:
+        draw_parking_spot(frame, spot, spot['id'] in occupied_spots)
+
+def draw_parking_spot(frame, spot, occupied):
+    """Draw a single parking spot in its occupied or available style"""
+    x, y, w, h = spot['x'], spot['y'], spot['width'], spot['height']
+    spot_id = spot['id']
+
+    # Determine spot colors and styling
+    if occupied:
+        # Occupied spot - red with grid styling
+        primary_color = (0, 0, 255)  # Red
+        fill_color = (0, 0, 180)     # Darker red
+        accent_color = (0, 0, 220)   # Medium red
+        status_text = "OCCUPIED"
+    else:
+        # Available spot - green with grid styling
+        primary_color = (0, 255, 0)  # Green
+        fill_color = (0, 180, 0)     # Darker green
+        accent_color = (0, 220, 0)   # Medium green
+        status_text = "AVAILABLE"
+
+    # Draw grid-style spot background
+    cv2.rectangle(frame, (x, y), (x + w, y + h), fill_color, -1)  # Fill
+
+    # Draw grid pattern within spot
+    grid_spacing = 15
+    for gx in range(x + grid_spacing, x + w, grid_spacing):
+        cv2.line(frame, (gx, y), (gx, y + h), accent_color, 1)
+    for gy in range(y + grid_spacing, y + h, grid_spacing):
+        cv2.line(frame, (x, gy), (x + w, gy), accent_color, 1)
+
+    # Draw spot border with enhanced styling
+    cv2.rectangle(frame, (x, y), (x + w, y + h), primary_color, 3)
+    cv2.rectangle(frame, (x-1, y-1), (x + w + 1, y + h + 1), (255, 255, 255), 1)  # White outline
+
+    # Draw spot ID with background
+    id_bg_x1, id_bg_y1 = x + 2, y + 2
+    id_bg_x2, id_bg_y2 = x + 35, y + 20
+    cv2.rectangle(frame, (id_bg_x1, id_bg_y1), (id_bg_x2, id_bg_y2), (0, 0, 0), -1)
+    cv2.rectangle(frame, (id_bg_x1, id_bg_y1), (id_bg_x2, id_bg_y2), primary_color, 2)
+    cv2.putText(frame, spot_id, (x + 5, y + 16), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+    # Draw enhanced status indicators
+    if occupied:
+        # Draw car icon with grid styling
+        car_center_x = x + w // 2
+        car_center_y = y + h // 2
+
+        # Car body
+        cv2.ellipse(frame, (car_center_x, car_center_y), (30, 15), 0, 0, 360, (255, 255, 255), -1)
+        cv2.ellipse(frame, (car_center_x, car_center_y), (30, 15), 0, 0, 360, primary_color, 2)
+
+        # Car details
+        cv2.ellipse(frame, (car_center_x - 10, car_center_y), (8, 6), 0, 0, 360, (200, 200, 200), -1)
+        cv2.ellipse(frame, (car_center_x + 10, car_center_y), (8, 6), 0, 0, 360, (200, 200, 200), -1)
+
+        # Occupied indicator
+        cv2.circle(frame, (x + w - 10, y + 10), 5, (255, 0, 0), -1)
+        cv2.circle(frame, (x + w - 10, y + 10), 5, (255, 255, 255), 2)
+    else:
+        # Available indicator with grid pattern
+        cv2.circle(frame, (x + w - 10, y + 10), 5, (0, 255, 0), -1)
+        cv2.circle(frame, (x + w - 10, y + 10), 5, (255, 255, 255), 2)
+
+        # Draw parking lines
+        line_y = y + h - 15
+        cv2.line(frame, (x + 10, line_y), (x + w - 10, line_y), (255, 255, 255), 2)
+
+    # Draw status text with background
+    text_size = cv2.getTextSize(status_text, cv2.FONT_HERSHEY_SIMPLEX, 0.4, 1)[0]
+    text_x = x + (w - text_size[0]) // 2
+    text_y = y + h - 5
+
+    # Text background
+    cv2.rectangle(frame, (text_x - 2, text_y - 12), (text_x + text_size[0] + 2, text_y + 2), (0, 0, 0), -1)
+    cv2.putText(frame, status_text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
 
 def verify_system_consistency():
     """Verify consistency between detection zones, UI dimensions, and camera feed"""
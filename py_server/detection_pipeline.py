@@ -0,0 +1,220 @@
+"""
+Detection Pipeline Module
+Runs parking detection once per captured frame in a background thread and
+publishes the result as an immutable snapshot shared by every HTTP route.
+Ambulance detection has its own lane (ambulance_lane.py).
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+import numpy as np
+
+from car_detection import analyze_parking, default_layout, load_cascades
+from metrics import (ASSIGNMENT_SECONDS, CASCADE_SECONDS, DETECTION_SECONDS, DETECTIONS_PER_FRAME,
+                     PREPROCESS_SECONDS)
+from profiling import checkpoint
+from scheduler import PRIORITY_PARKING, ScheduledTask
+
+
+@dataclass(frozen=True)
+class DetectionResult:
+    """Immutable detection snapshot for a single processed frame"""
+    frame_seq: int
+    captured_at: float
+    processed_at: float
+    occupied_spots: tuple = ()
+    confidences: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    cars: tuple = ()
+    spot_cars: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    detection_ms: float = 0.0
+    gated: bool = False
+
+    def to_dict(self):
+        return {
+            'occupied_spots': list(self.occupied_spots),
+            'confidences': dict(self.confidences),
+            'cars': [list(car) for car in self.cars],
+            'spot_cars': {spot_id: list(car) for spot_id, car in self.spot_cars.items()},
+            'frame_seq': self.frame_seq,
+            'gated': self.gated,
+            'captured_at': self.captured_at,
+            'timestamp': self.processed_at
+        }
+
+
+class DetectionWorker:
+    """Background worker that analyses each new camera frame exactly once"""
+
+    def __init__(self, camera, motion_gate=None, layout=None, pool=None, gate=None, task=None, settling=None):
+        self.camera = camera
+        self.motion_gate = motion_gate
+        # Callable that is True while the debounce waits on more analysed frames; bypasses the gate
+        self.settling = settling
+        self.layout = layout or default_layout
+        self.pool = pool
+        self.gate = gate  # PriorityGate shared with the ambulance lane
+        # Unpaced (every new frame) unless a CPU budget caps the rate
+        self.task = task or ScheduledTask('parking', camera.name, PRIORITY_PARKING)
+        self.processed_fps = 0.0
+        self.load = 0.0  # fraction of wall time spent detecting
+        self._last_cycle = None
+        self.condition = threading.Condition()
+        self.result = None
+        self.listeners = []
+        self.warmed_up = False
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(), name=f"detection-{camera.name}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _warm_up(self):
+        """Load the cascades and run one throwaway detection pass before the first real frame"""
+        started = time.time()
+        load_cascades()
+
+        blank = np.zeros((self.layout.feed_height, self.layout.feed_width, 3), dtype=np.uint8)
+        try:
+            if self.pool is not None:
+                self.pool.analyze(blank, self.layout)
+            else:
+                analyze_parking(blank, self.layout)
+        except Exception as e:
+            print(f"Error warming up detector for camera {self.camera.name}: {e}")
+        self.warmed_up = True
+        print(f"🔥 Detector for camera {self.camera.name} warmed up in {time.time() - started:.2f}s")
+
+    def _run(self):
+        self._warm_up()
+        last_seq = 0
+        while self.running:
+            checkpoint()
+            delay = self.task.delay()
+            if delay > 0:
+                with self.condition:
+                    self.condition.wait_for(lambda: not self.running, timeout=delay)
+                continue
+            # Ambulance work goes first when both want the CPU
+            if self.gate is not None:
+                self.gate.wait_turn(self.camera.name)
+            # Wait for a newer frame and hold it out of the camera ring while analysing
+            lease = self.camera.acquire(after_seq=last_seq, timeout=0.5)
+            if lease is None:
+                if not self.camera.running:
+                    break
+                continue
+            with lease:
+                last_seq = lease.seq
+                result = self.process(lease.frame, lease.seq, lease.timestamp)
+            busy = result.detection_ms / 1000.0
+            self.task.record(result.processed_at - busy, busy)
+            self._record_cycle(busy)
+            self._publish(result)
+
+    def _record_cycle(self, busy):
+        now = time.time()
+        if self._last_cycle is not None:
+            cycle = max(now - self._last_cycle, 1e-6)
+            self.processed_fps = 0.9 * self.processed_fps + 0.1 / cycle
+            self.load = 0.9 * self.load + 0.1 * min(1.0, busy / cycle)
+        self._last_cycle = now
+
+    def process(self, frame, seq, captured_at):
+        """Run all detectors on a frame and build a snapshot"""
+        started = time.time()
+        previous = self.result
+
+        # Reuse the previous parking result while the scene is static, unless the
+        # debounce is mid-streak and needs consecutive analysed frames to finish
+        if self.motion_gate is not None and self.settling is not None and self.settling():
+            self.motion_gate.reset()
+        gated = (previous is not None and self.motion_gate is not None
+                 and not self.motion_gate.check(frame))
+        if previous is None and self.motion_gate is not None:
+            self.motion_gate.check(frame)  # seed the reference frame
+
+        if gated:
+            parking = None
+        elif self.pool is not None:
+            parking = self.pool.analyze(frame, self.layout)
+        else:
+            parking = analyze_parking(frame, self.layout)
+
+        if gated:
+            occupied_spots = previous.occupied_spots
+            confidences = previous.confidences
+            cars = previous.cars
+            spot_cars = previous.spot_cars
+        else:
+            occupied_spots = tuple(parking['occupied_spots'])
+            confidences = MappingProxyType(dict(parking['confidences']))
+            cars = tuple(parking['cars'])
+            spot_cars = MappingProxyType(dict(parking['spot_cars']))
+            DETECTIONS_PER_FRAME.observe(len(cars), self.camera.name)
+            # Stage timings come back with the result, so pool workers are covered too
+            timings = parking.get('timings', {})
+            for stage, histogram in (('preprocess', PREPROCESS_SECONDS), ('cascade', CASCADE_SECONDS),
+                                     ('assignment', ASSIGNMENT_SECONDS)):
+                if stage in timings:
+                    histogram.observe(timings[stage], self.camera.name)
+
+        finished = time.time()
+        DETECTION_SECONDS.observe(finished - started, self.camera.name)
+
+        return DetectionResult(
+            frame_seq=seq,
+            captured_at=captured_at,
+            processed_at=finished,
+            occupied_spots=occupied_spots,
+            confidences=confidences,
+            cars=cars,
+            spot_cars=spot_cars,
+            detection_ms=(finished - started) * 1000.0,
+            gated=gated
+        )
+
+    def _publish(self, result):
+        with self.condition:
+            self.result = result
+            self.condition.notify_all()
+        for listener in self.listeners:
+            try:
+                listener(result)
+            except Exception as e:
+                print(f"Error in detection listener: {e}")
+
+    def add_listener(self, callback):
+        """Call callback(result) from the worker thread for every published snapshot"""
+        self.listeners.append(callback)
+
+    def stats(self):
+        """Detection rate, load and how much work the motion gate saved"""
+        stats = {
+            'processed_fps': round(self.processed_fps, 2),
+            'load': round(self.load, 3),
+            'motion_gate': self.motion_gate is not None
+        }
+        if self.motion_gate is not None:
+            stats.update(self.motion_gate.stats())
+        return stats
+
+    def latest(self):
+        """Return the most recent snapshot, or None before the first frame is processed"""
+        return self.result
+
+    def wait_for_result(self, after_seq=0, timeout=None):
+        """Block until a snapshot newer than after_seq is available"""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: not self.running or (self.result is not None and self.result.frame_seq > after_seq),
+                timeout=timeout
+            )
+            return self.result
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join()
@@ -0,0 +1,123 @@
+"""
+Detection Pool Module
+Optional pool of worker processes that run the cascades outside the server
+process, so detection for several cameras uses all CPU cores.
+
+Frames are handed over through one shared-memory buffer per submitting
+thread; only the small detection results travel back through pickling.
+Layouts are referred to by (name, version): a worker that has not seen a
+version yet answers LayoutUnknown and the task is resent once with the spots.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+# Per-process state inside pool workers
+_worker_buffers = OrderedDict()
+_worker_layouts = {}
+
+
+class LayoutUnknown(Exception):
+    """Raised in a worker asked to use a layout version it has not been sent"""
+
+
+def _worker_init():
+    """Load both cascades once when the worker process starts"""
+    import car_detection
+    car_detection.load_cascades()
+
+
+def _attach_buffer(name):
+    shm = _worker_buffers.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_buffers[name] = shm
+        # Buffers are recreated when frames grow; forget the oldest mappings
+        while len(_worker_buffers) > 64:
+            _worker_buffers.popitem(last=False)[1].close()
+    return shm
+
+
+def _worker_layout(layout_key, definition):
+    from car_detection import ParkingLayout
+    layout = _worker_layouts.get(layout_key)
+    if layout is None:
+        if definition is None:
+            raise LayoutUnknown(layout_key)
+        spots, feed_size, ambulance_roi = definition
+        layout = ParkingLayout(spots, feed_size[0], feed_size[1], name=layout_key[0], ambulance_roi=ambulance_roi)
+        # Older versions of the same layout will not be asked for again
+        for key in [key for key in _worker_layouts if key[0] == layout_key[0]]:
+            del _worker_layouts[key]
+        _worker_layouts[layout_key] = layout
+    return layout
+
+
+def _worker_run(task, buffer_name, shape, layout_key, definition=None):
+    from car_detection import analyze_parking, find_ambulances
+
+    layout = _worker_layout(layout_key, definition)
+    shm = _attach_buffer(buffer_name)
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+    if task == 'parking':
+        return analyze_parking(frame, layout)
+    return find_ambulances(frame, layout)
+
+
+class DetectionPool:
+    """Runs analyze_parking and find_ambulances in worker processes"""
+
+    def __init__(self, workers):
+        self.workers = workers
+        # 'spawn' avoids forking a process that already runs capture threads
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                            initializer=_worker_init)
+        self._local = threading.local()
+        self._buffers = []
+        self._lock = threading.Lock()
+        print(f"🧵 Detection pool started with {workers} worker processes")
+
+    def _buffer(self, nbytes):
+        """Shared-memory frame buffer owned by the calling thread"""
+        shm = getattr(self._local, 'shm', None)
+        if shm is None or shm.size < nbytes:
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            with self._lock:
+                self._buffers.append(shm)
+            self._local.shm = shm
+        return shm
+
+    def analyze(self, frame, layout):
+        """Return the analyze_parking result for frame, computed in a worker process"""
+        return self._submit('parking', frame, layout)
+
+    def find_ambulances(self, frame, layout):
+        """Return the find_ambulances result for frame, computed in a worker process"""
+        return self._submit('ambulance', frame, layout)
+
+    def _submit(self, task, frame, layout):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        shm = self._buffer(frame.nbytes)
+        np.copyto(np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf), frame)
+
+        # The calling thread blocks until the result is back, so its buffer
+        # is never overwritten while a worker is still reading it
+        layout_key = (layout.name, layout.version)
+        try:
+            return self.executor.submit(_worker_run, task, shm.name, frame.shape, layout_key).result()
+        except LayoutUnknown:
+            definition = (layout.spots, (layout.feed_width, layout.feed_height), layout.ambulance_roi)
+            return self.executor.submit(_worker_run, task, shm.name, frame.shape, layout_key, definition).result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            for shm in self._buffers:
+                shm.close()
+                shm.unlink()
+            self._buffers = []
@@ -0,0 +1,110 @@
+"""
+Event Stream Module
+Server-Sent Events push stream for occupancy changes and ambulance alerts,
+backed by the shared EventLog so reconnecting clients can resume with
+Last-Event-ID.
+"""
+
+import json
+from datetime import datetime, timezone
+
+from metrics import AMBULANCE_ALERT_LATENCY
+
+PARKING_EVENT_TYPES = ('car_parked', 'car_left')
+AMBULANCE_EVENT_TYPES = ('ambulance_detected', 'ambulance_cleared')
+
+
+class AmbulanceAlertMonitor:
+    """Turns confirmed ambulance lane sightings into edge-triggered alert events"""
+
+    def __init__(self, event_log, camera=''):
+        self.event_log = event_log
+        self.camera = camera
+        self.active = False
+
+    def update(self, result):
+        if result.confirmed == self.active:
+            return None
+        self.active = result.confirmed
+        event = {
+            'event': 'ambulance_detected' if self.active else 'ambulance_cleared',
+            'frame_seq': result.frame_seq,
+            'timestamp': _isoformat(result.processed_at),
+            'captured_at': _isoformat(result.captured_at)
+        }
+        if self.active:
+            event['boxes'] = [list(detection[:4]) for detection in result.detections]
+            event['confidence'] = result.confidence
+            if result.first_seen_at is not None:
+                event['first_seen_at'] = _isoformat(result.first_seen_at)
+                AMBULANCE_ALERT_LATENCY.observe(result.processed_at - result.first_seen_at, self.camera)
+        return self.event_log.append(event)
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def parse_filter(value):
+    """Parse a comma separated query parameter into a set, or None when absent"""
+    if not value:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+def event_matches(event, spots=None, sections=None):
+    # Ambulance alerts are never filtered out by spot or section
+    if event['event'] in AMBULANCE_EVENT_TYPES:
+        return True
+    if spots is not None and event.get('spot_id') not in spots:
+        return False
+    if sections is not None and event.get('section') not in sections:
+        return False
+    return True
+
+
+def format_sse(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def generate_events(event_log, last_event_id=None, spots=None, sections=None,
+                    event_types=None, initial_state=None, heartbeat=15.0, retry_ms=3000):
+    """Yield SSE messages for new events, with periodic heartbeats.
+
+    Without a Last-Event-ID the client first receives a 'status' event built by
+    initial_state() and then only events from that point on. With one, every
+    retained event after that id is replayed; a 'resync' event tells the client
+    the gap was too large and it should refetch the full state.
+    """
+    yield f"retry: {retry_ms}\n\n"
+
+    # An id from before a server restart cannot be resumed
+    if last_event_id is not None and last_event_id > event_log.cursor:
+        last_event_id = None
+
+    if last_event_id is None:
+        cursor = event_log.cursor
+        if initial_state is not None:
+            yield format_sse(initial_state(), event='status', event_id=cursor)
+    else:
+        cursor = last_event_id
+
+    while True:
+        events, latest, truncated = event_log.wait_since(cursor, event_types=event_types, timeout=heartbeat)
+        if truncated:
+            yield format_sse({'cursor': latest}, event='resync', event_id=latest)
+        if latest == cursor:
+            # Comment lines keep proxies and the browser from timing the stream out
+            yield ": heartbeat\n\n"
+            continue
+
+        for event in events:
+            if event_matches(event, spots, sections):
+                yield format_sse(event, event=event['event'], event_id=event['cursor'])
+        cursor = latest
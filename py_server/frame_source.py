@@ -0,0 +1,232 @@
+"""
+Frame Source Module
+Uniform access to the places frames can come from: a camera device index,
+a local video file, a directory of images or a stream URL (rtsp://, http://).
+
+A PrefetchReader decodes on its own thread into a small bounded buffer.
+Live sources drop the oldest buffered frame when the consumer falls behind;
+file sources block instead, so recorded footage is never skipped. Frame
+arrays handed back through recycle() are decoded into again, so a steady
+stream allocates nothing.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from metrics import CAPTURE_SECONDS
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+class FrameSource:
+    """Base class; read(out) returns (ok, frame) like cv2.VideoCapture, decoding into out when it can"""
+
+    live = True    # frames arrive at the device's pace and cannot be replayed
+    fps = 0.0      # nominal rate, 0 when unknown
+
+    def is_opened(self):
+        return True
+
+    def read(self, out=None):
+        raise NotImplementedError
+
+    def skip(self):
+        """Advance one frame without needing its pixels; returns False at the end"""
+        return self.read()[0]
+
+    def rewind(self):
+        """Restart from the first frame; returns False when the source cannot"""
+        return False
+
+    def release(self):
+        pass
+
+
+class CaptureSource(FrameSource):
+    """Anything cv2.VideoCapture opens: device indexes, stream URLs and video files"""
+
+    def __init__(self, spec, live=True, width=None, height=None, fps=None):
+        self.spec = spec
+        self.live = live
+        self.cap = cv2.VideoCapture(spec)
+        if self.cap.isOpened() and live:
+            # Resolution and rate are only negotiable with devices and some streams
+            if width:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            if height:
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            if fps:
+                self.cap.set(cv2.CAP_PROP_FPS, fps)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def read(self, out=None):
+        return self.cap.read(out) if out is not None else self.cap.read()
+
+    def skip(self):
+        # grab() demuxes without decoding into a BGR image
+        return self.cap.grab()
+
+    def rewind(self):
+        return not self.live and self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    """Images in a directory, read in file-name order"""
+
+    live = False
+
+    def __init__(self, path, fps=None):
+        self.path = path
+        self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.fps = float(fps or 10)
+        self.position = 0
+
+    def is_opened(self):
+        return len(self.files) > 0
+
+    def read(self, out=None):
+        while self.position < len(self.files):
+            frame = cv2.imread(self.files[self.position])
+            self.position += 1
+            if frame is not None:
+                return True, frame
+            print(f"⚠️ Skipping unreadable image {self.files[self.position - 1]}")
+        return False, None
+
+    def skip(self):
+        if self.position >= len(self.files):
+            return False
+        self.position += 1
+        return True
+
+    def rewind(self):
+        self.position = 0
+        return True
+
+
+def open_frame_source(spec, width=None, height=None, fps=None):
+    """Open a frame source from a device index, video file, image directory or stream URL"""
+    if isinstance(spec, str) and spec.strip().isdigit():
+        spec = int(spec)
+    if isinstance(spec, int):
+        return CaptureSource(spec, live=True, width=width, height=height, fps=fps)
+    if '://' in spec:
+        return CaptureSource(spec, live=True)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, fps=fps)
+    return CaptureSource(spec, live=False)
+
+
+class PrefetchReader:
+    """Decode thread that reads ahead from a FrameSource into a bounded buffer"""
+
+    def __init__(self, source, buffer_size=4, loop=False, name=''):
+        self.source = source
+        self.name = name
+        self.buffer_size = max(1, buffer_size)
+        self.loop = loop
+        self.buffer = deque()
+        self.free = []  # recycled frame arrays to decode into
+        self.condition = threading.Condition()
+        self.frames_read = 0
+        self.dropped_frames = 0
+        self.finished = False
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(), name=f"decode-{name}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        frames_this_pass = 0
+        while self.running:
+            with self.condition:
+                out = self.free.pop() if self.free else None
+            started = time.perf_counter()
+            ok, frame = self.source.read(out)
+            if not ok:
+                # Replay files from the start; give up on an empty pass
+                if self.loop and frames_this_pass and self.source.rewind():
+                    frames_this_pass = 0
+                    continue
+                break
+            frames_this_pass += 1
+            CAPTURE_SECONDS.observe(time.perf_counter() - started, self.name)
+
+            with self.condition:
+                if self.source.live:
+                    if len(self.buffer) >= self.buffer_size:
+                        self._recycle(self.buffer.popleft()[0])
+                        self.dropped_frames += 1
+                else:
+                    self.condition.wait_for(lambda: not self.running or len(self.buffer) < self.buffer_size)
+                    if not self.running:
+                        break
+                self.buffer.append((frame, time.time()))
+                self.frames_read += 1
+                self.condition.notify_all()
+
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def read(self, timeout=None):
+        """Return the next buffered (frame, decode time), or (None, None) once exhausted or on timeout"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.buffer or self.finished or not self.running, timeout=timeout)
+            if not self.buffer:
+                return None, None
+            item = self.buffer.popleft()
+            self.condition.notify_all()
+            return item
+
+    def _recycle(self, frame):
+        # Callers hold the condition; the pool only needs to cover frames in flight
+        if len(self.free) < self.buffer_size + 2:
+            self.free.append(frame)
+
+    def recycle(self, frame):
+        """Give a frame array that nobody references any more back for decoding into"""
+        with self.condition:
+            self._recycle(frame)
+
+    @property
+    def exhausted(self):
+        with self.condition:
+            return self.finished and not self.buffer
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join()
+        self.source.release()
+
+
+class FramePacer:
+    """Sleeps so frames from a recorded source are delivered at its nominal rate"""
+
+    def __init__(self, fps):
+        self.interval = 1.0 / fps if fps else 0.0
+        self.next_time = None
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.time()
+        if self.next_time is None or now - self.next_time > 1.0:
+            # Start over after a stall instead of bursting to catch up
+            self.next_time = now
+        elif self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time += self.interval
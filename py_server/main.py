@@ -1,84 +1,17 @@
-from flask import Flask, jsonify, Response
+from flask import Flask, jsonify, Response, request, abort
 from flask_cors import CORS
-from car_detection import generate_frames, get_parking_status, detect_ambulance
-import cv2
-import threading
+from camera_manager import CameraManager
+from event_stream import PARKING_EVENT_TYPES, generate_events, parse_filter
+from metrics import HTTP_REQUEST_SECONDS, REGISTRY, Counter, Gauge
+import profiling
 import time
 import os
-from camera_config import get_camera_index, load_camera_config
-
-# Camera detection and configuration is now handled by camera_config.py
-
-class Camera:
-    def __init__(self):
-        # Get camera index using the configuration system
-        self.camera_index = get_camera_index()
-
-        print(f"🎥 Attempting to open camera at index {self.camera_index}")
-        self.cap = cv2.VideoCapture(self.camera_index)
-
-        # Configure camera settings
-        if self.cap.isOpened():
-            # Load configuration or use defaults
-            config = load_camera_config()
-            if config:
-                width = config.get('width', 1280)
-                height = config.get('height', 720)
-                fps = config.get('fps', 30)
-            else:
-                width, height, fps = 1280, 720, 30
-
-            # Set camera properties
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-            self.cap.set(cv2.CAP_PROP_FPS, fps)
-
-            # Get actual settings
-            actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            actual_fps = self.cap.get(cv2.CAP_PROP_FPS)
-
-            print(f"✅ Camera initialized: {actual_width}x{actual_height} @ {actual_fps:.1f}fps")
-
-            # Test if camera is working
-            ret, test_frame = self.cap.read()
-            if ret:
-                print(f"✅ Camera test successful - Frame size: {test_frame.shape}")
-            else:
-                print("❌ Camera test failed - Cannot read frames")
-        else:
-            print(f"❌ Failed to open camera at index {self.camera_index}")
-            print("💡 Try running 'python test_cameras.py' to identify available cameras")
-            print("💡 Or run 'python camera_config.py' for interactive setup")
-
-        self.lock = threading.Lock()
-        self.frame = None
-        self.running = True
-        self.thread = threading.Thread(target=self._update, args=())
-        self.thread.daemon = True
-        self.thread.start()
-
-    def _update(self):
-        while self.running:
-            ret, frame = self.cap.read()
-            if ret:
-                with self.lock:
-                    self.frame = frame
-            else:
-                print("Error: Could not read frame from camera")
-                self.running = False
-            time.sleep(0.03) # 30 fps
-
-    def get_frame(self):
-        with self.lock:
-            if self.frame is None:
-                return None
-            return self.frame.copy()
-
-    def release(self):
-        self.running = False
-        self.thread.join()
-        self.cap.release()
+import base64
+import hmac
+import struct
+
+# Camera detection and configuration is now handled by camera_config.py,
+# capture by camera.py and per-camera pipelines by camera_manager.py
 
 app = Flask(__name__)
 
@@ -101,35 +34,360 @@ if not allowed_origins:
 CORS(app, 
      origins=allowed_origins,
      allow_headers=['Content-Type', 'Authorization'],
+     expose_headers=['ETag'],
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
 
-camera = Camera()
+# Detection pool workers (DETECTION_WORKERS) are started with 'spawn' and
+# re-import this file as __mp_main__; only the server process opens cameras.
+# Cameras open in the background so the server binds straight away
+cameras = CameraManager(background=True) if __name__ != '__mp_main__' else None
+
+def get_pipeline(camera_id=None):
+    """Resolve a camera id from the URL; routes without one use the first camera"""
+    pipeline = cameras.get(camera_id)
+    if pipeline is None:
+        if cameras.starting:
+            abort(503, description='Cameras are still starting')
+        abort(404, description=f'Unknown camera: {camera_id}')
+    return pipeline
+
+def per_camera(value):
+    """Scrape-time metric callback reading value(pipeline) for every camera"""
+    return lambda: {(pipeline.id,): value(pipeline) for pipeline in cameras.all()} if cameras else {}
+
+Gauge('parking_capture_fps', "Capture rate per camera", ['camera'],
+      callback=per_camera(lambda pipeline: pipeline.camera.fps))
+Counter('parking_frames_captured', "Frames captured per camera", ['camera'],
+        callback=per_camera(lambda pipeline: pipeline.camera.frame_seq))
+Counter('parking_frames_dropped', "Frames dropped because capture outran the consumer", ['camera'],
+        callback=per_camera(lambda pipeline: pipeline.camera.dropped_frames))
+Gauge('parking_detection_fps', "Frames analysed per second per camera", ['camera'],
+      callback=per_camera(lambda pipeline: pipeline.detector.processed_fps))
+Gauge('parking_video_feed_streams', "Open /video_feed streams per camera", ['camera'],
+      callback=per_camera(lambda pipeline: pipeline.broadcaster.subscribers))
+
+def per_task(value):
+    """Scrape-time metric callback reading value(task) for every scheduled task"""
+    return lambda: {(task.camera, task.name): value(task) for task in list(cameras.scheduler.tasks)} if cameras else {}
+
+Gauge('parking_task_target_fps', "Rate a scheduled task asks for (0 when unpaced)", ['camera', 'task'],
+      callback=per_task(lambda task: task.target_fps or 0))
+Gauge('parking_task_allowed_fps', "Rate the CPU budget allows a task (0 when uncapped)", ['camera', 'task'],
+      callback=per_task(lambda task: task.allowed_fps or 0))
+Gauge('parking_task_fps', "Rate a scheduled task actually runs at", ['camera', 'task'],
+      callback=per_task(lambda task: task.actual_fps))
+Gauge('parking_task_cost_seconds', "Average time per run of a scheduled task", ['camera', 'task'],
+      callback=per_task(lambda task: task.cost))
+Gauge('parking_cpu_budget_cores', "Configured CPU budget in cores (0 when unlimited)",
+      callback=lambda: {(): cameras.scheduler.budget or 0} if cameras else {})
+Gauge('parking_cpu_allocated_cores', "Estimated CPU used by scheduled tasks at their allowed rates",
+      callback=lambda: {(): cameras.scheduler.allocated} if cameras else {})
+Gauge('parking_process_cpu_cores', "CPU actually used by the server process",
+      callback=lambda: {(): cameras.scheduler.process_cpu} if cameras else {})
+
+@app.before_request
+def start_request_timer():
+    request.started_at = time.perf_counter()
+    if request.endpoint != 'profile':
+        profiling.checkpoint()
+
+@app.teardown_request
+def stop_request_profiling(exc):
+    profiling.release()
+
+@app.after_request
+def record_request_metrics(response):
+    started = getattr(request, 'started_at', None)
+    if started is not None:
+        # Label by route pattern so per-camera URLs do not explode the series count
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, request.method, response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+PROFILE_MAX_SECONDS = 120
+PROFILE_SORT_KEYS = ('cumulative', 'tottime', 'ncalls', 'pcalls', 'filename', 'name')
+
+def require_admin():
+    """Admin routes exist only when ADMIN_TOKEN is set and need it as a bearer token"""
+    token = os.getenv('ADMIN_TOKEN')
+    if not token:
+        abort(404)
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+        abort(401, description='Admin token required')
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def profile():
+    """Profile the whole server for ?seconds=N; mode=sampling|cprofile, format=collapsed|stats|pstats"""
+    require_admin()
+    mode = request.args.get('mode', 'sampling')
+    fmt = request.args.get('format', 'collapsed' if mode == 'sampling' else 'stats')
+    sort = request.args.get('sort', 'cumulative')
+    try:
+        seconds = float(request.args.get('seconds', '10'))
+        interval = float(request.args.get('interval_ms', '5')) / 1000.0
+        limit = int(request.args.get('limit', '50'))
+    except ValueError:
+        return jsonify({'error': 'seconds, interval_ms and limit must be numbers'}), 400
+    if mode not in profiling.MODES:
+        return jsonify({'error': f'mode must be one of {", ".join(profiling.MODES)}'}), 400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS or interval <= 0:
+        return jsonify({'error': f'seconds must be in (0, {PROFILE_MAX_SECONDS}] and interval_ms positive'}), 400
+    if (mode, fmt) not in (('sampling', 'collapsed'), ('sampling', 'stats'),
+                           ('cprofile', 'stats'), ('cprofile', 'pstats')):
+        return jsonify({'error': f'format {fmt} is not available in {mode} mode'}), 400
+    if sort not in PROFILE_SORT_KEYS:
+        return jsonify({'error': f'sort must be one of {", ".join(PROFILE_SORT_KEYS)}'}), 400
+
+    try:
+        session = profiling.run(mode, seconds, interval)
+    except profiling.ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    except profiling.ProfilerUnavailable as e:
+        return jsonify({'error': str(e)}), 501
+
+    if fmt == 'collapsed':
+        return Response(profiling.collapsed(session), mimetype='text/plain',
+                        headers={'Content-Disposition': 'attachment; filename=profile.folded'})
+    if fmt == 'pstats':
+        return Response(profiling.cprofile_dump(session), mimetype='application/octet-stream',
+                        headers={'Content-Disposition': 'attachment; filename=profile.pstats'})
+    if mode == 'sampling':
+        return Response(profiling.sampling_stats(session, limit), mimetype='text/plain')
+    return Response(profiling.cprofile_stats(session, sort, limit), mimetype='text/plain')
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: every started camera is producing frames and its detector has warmed up"""
+    details = {pipeline.id: pipeline.readiness() for pipeline in cameras.all()}
+    ready = not cameras.starting and bool(details) and all(
+        state['running'] and state['producing_frames'] and state['detector_warmed_up'] for state in details.values())
+    return jsonify({
+        'status': 'ready' if ready else 'not ready',
+        'starting': cameras.starting,
+        'cameras': details,
+        'failed': dict(cameras.failed)
+    }), 200 if ready else 503
+
+@app.route('/cameras')
+def list_cameras():
+    return jsonify({'cameras': [pipeline.info() for pipeline in cameras.all()]})
 
 @app.route('/video_feed')
-def video_feed():
-    return Response(generate_frames(camera),
+@app.route('/cameras/<camera_id>/video_feed')
+def video_feed(camera_id=None):
+    """MJPEG stream; ?fps= sets this client's frame rate (capped by STREAM_MAX_FPS)"""
+    pipeline = get_pipeline(camera_id)
+    fps = request.args.get('fps')
+    if fps is not None:
+        try:
+            fps = float(fps)
+        except ValueError:
+            fps = 0
+        if fps <= 0:
+            return jsonify({'error': 'fps must be a positive number'}), 400
+    return Response(pipeline.broadcaster.subscribe(fps, sock=request.environ.get('werkzeug.socket')),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/snapshot.jpg')
+@app.route('/cameras/<camera_id>/snapshot.jpg')
+def snapshot(camera_id=None):
+    """Annotated still; ?width= (up to the feed width) and ?quality= (1-100) pick the cached tier"""
+    pipeline = get_pipeline(camera_id)
+    try:
+        width = int(request.args['width']) if 'width' in request.args else None
+        quality = int(request.args.get('quality', '80'))
+    except ValueError:
+        return jsonify({'error': 'width and quality must be integers'}), 400
+    if (width is not None and width <= 0) or not 1 <= quality <= 100:
+        return jsonify({'error': 'width must be positive and quality between 1 and 100'}), 400
+
+    seq, width, jpeg = pipeline.snapshots.get(width, quality)
+    if jpeg is None:
+        return jsonify({'error': 'No frame captured yet'}), 503
+
+    etag = f"{pipeline.id}.{seq}.{width}.{quality}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(jpeg, mimetype='image/jpeg')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def parking_status_etag(spot_tracker, version, fmt, since_version):
+    return f"{spot_tracker.layout_generation}.{version}.{fmt}.{since_version if since_version is not None else ''}"
+
 @app.route('/parking_status')
-def parking_status():
-    frame = camera.get_frame()
-    if frame is None:
+@app.route('/cameras/<camera_id>/parking_status')
+def parking_status(camera_id=None):
+    """Debounced occupancy with ETag support.
+
+    ?format=json (default), bitset (base64 JSON) or binary
+    (little-endian uint64 version, uint32 spot count, then the bitset).
+    ?since_version=N returns only the spots that changed after version N
+    (JSON only).
+    """
+    pipeline = get_pipeline(camera_id)
+    spot_tracker = pipeline.spot_tracker
+    if pipeline.detector.latest() is None:
+        return jsonify({'error': 'Could not get frame from camera'}), 500
+
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'bitset', 'binary'):
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    since_version = request.args.get('since_version', type=int)
+    if since_version is not None and fmt != 'json':
+        return jsonify({'error': f'since_version is not supported with format {fmt}'}), 400
+
+    # Answer unchanged polls before building any body
+    current_etag = parking_status_etag(spot_tracker, spot_tracker.version, fmt, since_version)
+    if request.if_none_match.contains(current_etag):
+        response = Response(status=304)
+        response.set_etag(current_etag)
+        return response
+
+    if since_version is not None:
+        version, changes, complete = spot_tracker.changes_since(since_version)
+        if complete:
+            body = {
+                'version': version,
+                'since_version': since_version,
+                'full': False,
+                'changes': [{'spot_id': spot_id, 'occupied': occupied} for spot_id, occupied in changes]
+            }
+        else:
+            version, changed_at, occupied_spots = spot_tracker.status()
+            body = {
+                'version': version,
+                'since_version': since_version,
+                'full': True,
+                'occupied_spots': occupied_spots
+            }
+        response = jsonify(body)
+    elif fmt == 'json':
+        version, changed_at, occupied_spots = spot_tracker.status()
+        response = jsonify({
+            'occupied_spots': occupied_spots,
+            'version': version,
+            'timestamp': changed_at
+        })
+    else:
+        version, bits = spot_tracker.bitset()
+        total_spots = len(spot_tracker.spots)
+        if fmt == 'binary':
+            response = Response(struct.pack('<QI', version, total_spots) + bits,
+                                mimetype='application/octet-stream')
+        else:
+            response = jsonify({
+                'version': version,
+                'total_spots': total_spots,
+                'bitset': base64.b64encode(bits).decode('ascii'),
+                'bit_order': 'lsb-first'
+            })
+
+    response.set_etag(parking_status_etag(spot_tracker, version, fmt, since_version))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/parking_status_initial')
+@app.route('/cameras/<camera_id>/parking_status_initial')
+def parking_status_initial(camera_id=None):
+    pipeline = get_pipeline(camera_id)
+    if pipeline.detector.latest() is None:
         return jsonify({'error': 'Could not get frame from camera'}), 500
-    
-    occupied_spots = get_parking_status(frame)
-    return jsonify({'occupied_spots': occupied_spots})
+
+    cursor = pipeline.event_log.cursor
+    status = pipeline.spot_tracker.snapshot()
+    status['cursor'] = cursor
+    return jsonify(status)
+
+@app.route('/parking_events')
+@app.route('/cameras/<camera_id>/parking_events')
+def parking_events(camera_id=None):
+    pipeline = get_pipeline(camera_id)
+    since = request.args.get('since', type=int)
+    events, cursor, truncated = pipeline.event_log.since(since, event_types=PARKING_EVENT_TYPES)
+    return jsonify({
+        'events': events,
+        'cursor': cursor,
+        'truncated': truncated,
+        'timestamp': time.time()
+    })
 
 @app.route('/ambulance_detection')
-def ambulance_detection():
-    frame = camera.get_frame()
-    if frame is None:
+@app.route('/cameras/<camera_id>/ambulance_detection')
+def ambulance_detection(camera_id=None):
+    lane = get_pipeline(camera_id).ambulance_lane
+    if lane.warmed_up and not lane.enabled:
+        return jsonify({'ambulance_detected': False, 'enabled': False})
+    result = lane.latest()
+    if result is None:
+        return jsonify({'error': 'Could not get frame from camera'}), 500
+
+    return jsonify({**result.to_dict(), 'enabled': True})
+
+@app.route('/detection_snapshot')
+@app.route('/cameras/<camera_id>/detection_snapshot')
+def detection_snapshot(camera_id=None):
+    pipeline = get_pipeline(camera_id)
+    result = pipeline.detector.latest()
+    if result is None:
         return jsonify({'error': 'Could not get frame from camera'}), 500
-    
-    ambulance_detected = detect_ambulance(frame)
-    return jsonify({'ambulance_detected': ambulance_detected})
+
+    return jsonify({**result.to_dict(), 'ambulance_detected': pipeline.ambulance_monitor.active})
+
+@app.route('/events')
+@app.route('/cameras/<camera_id>/events')
+def events_stream(camera_id=None):
+    pipeline = get_pipeline(camera_id)
+    spot_tracker = pipeline.spot_tracker
+    spots = parse_filter(request.args.get('spot'))
+    sections = parse_filter(request.args.get('section'))
+    # ?type=ambulance_detected,ambulance_cleared subscribes to alerts only
+    event_types = parse_filter(request.args.get('type'))
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+
+    def initial_state():
+        status = spot_tracker.snapshot()
+        status['occupied_spots'] = [
+            spot_id for spot_id in status['occupied_spots']
+            if (spots is None or spot_id in spots)
+            and (sections is None or spot_tracker.spots[spot_id].get('section') in sections)
+        ]
+        status['ambulance_detected'] = pipeline.ambulance_monitor.active
+        return status
+
+    return Response(
+        generate_events(pipeline.event_log, last_event_id, spots=spots, sections=sections,
+                        event_types=event_types, initial_state=initial_state),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/scheduler')
+def scheduler_stats():
+    """CPU budget, demand and the target, allowed and actual rate of every scheduled task"""
+    return jsonify(cameras.scheduler.stats())
+
+@app.route('/detection_stats')
+@app.route('/cameras/<camera_id>/detection_stats')
+def detection_stats(camera_id=None):
+    return jsonify(get_pipeline(camera_id).detector.stats())
 
 if __name__ == '__main__':
     try:
         app.run(port=5001, debug=False, threaded=True)
     finally:
-        camera.release()
\ No newline at end of file
+        cameras.stop()
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+Metrics Module
+Minimal in-process counters, gauges and histograms rendered in the
+Prometheus text exposition format for the /metrics endpoint.
+
+Recording is a perf_counter call, a bisect and one short lock, so the
+instrumentation stays on permanently. Gauges that mirror live state (fps,
+viewers) are read through callbacks at scrape time instead of being
+updated per frame.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; spans sub-millisecond overlay work up to multi-second stalls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 12, 20, 50, 100, 250, 500, 1000)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+    suffix = ''  # appended to the name in HELP/TYPE, e.g. counters are exposed as <name>_total
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def samples(self):
+        """Yield (suffix, label values, extra label, value)"""
+        return []
+
+    def render(self):
+        family = self.name + self.suffix
+        lines = [f"# HELP {family} {self.documentation}", f"# TYPE {family} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Gauge(Metric):
+    """Settable gauge; callback, if given, returns {label values tuple: value} at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.callback = callback
+        self.values = {}
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        if self.callback is not None:
+            try:
+                values.update(self.callback())
+            except Exception as e:
+                print(f"Error collecting metric {self.name}: {e}")
+        return [(self.suffix, labels, None, value) for labels, value in sorted(values.items())]
+
+
+class Counter(Gauge):
+    """Monotonic counter; a callback can expose a count the object already keeps"""
+    kind = 'counter'
+    suffix = '_total'
+
+    def inc(self, amount=1, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        with self.lock:
+            snapshot = {labels: list(series) for labels, series in self.series.items()}
+        samples = []
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                samples.append(('_bucket', labels, ('le', _format_value(float(bound))), cumulative))
+            samples.append(('_sum', labels, None, series[-1]))
+            samples.append(('_count', labels, None, cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+# Per-stage latencies of the frame path
+CAPTURE_SECONDS = Histogram('parking_capture_seconds', "Time to read and decode one frame", ['camera'])
+PREPROCESS_SECONDS = Histogram('parking_preprocess_seconds', "Grey conversion, equalisation and blur per detection pass", ['camera'])
+CASCADE_SECONDS = Histogram('parking_cascade_seconds', "Car cascade detectMultiScale time per detection pass", ['camera'])
+ASSIGNMENT_SECONDS = Histogram('parking_assignment_seconds', "Matching detections to spots per frame", ['camera'])
+DETECTION_SECONDS = Histogram('parking_detection_seconds', "Whole detection pass per frame, gated frames included", ['camera'])
+OVERLAY_SECONDS = Histogram('parking_overlay_seconds', "Drawing the parking overlay on a stream frame", ['camera'])
+ENCODE_SECONDS = Histogram('parking_encode_seconds', "JPEG encoding of a stream frame", ['camera'])
+FRAME_AGE_SECONDS = Histogram('parking_frame_age_seconds', "Age of a video frame when it is sent to a client", ['camera'])
+AMBULANCE_SECONDS = Histogram('parking_ambulance_seconds', "Ambulance lane search time per sampled frame", ['camera'])
+DETECTIONS_PER_FRAME = Histogram('parking_detections_per_frame', "Cars detected per analysed frame", ['camera'],
+                                 buckets=COUNT_BUCKETS)
+
+# Video feed delivery
+STREAM_SKIPPED_FRAMES = Counter('parking_video_feed_skipped_frames', "Frames a client was too slow or too throttled to receive", ['camera'])
+STREAM_STALLED_CLIENTS = Counter('parking_video_feed_stalled_clients', "Video clients disconnected for not draining", ['camera'])
+
+# Ambulance lane
+AMBULANCE_ALERT_LATENCY = Histogram('parking_ambulance_alert_latency_seconds',
+                                    "Capture of the first sighting to the confirmed alert", ['camera'])
+PARKING_PREEMPTED_SECONDS = Histogram('parking_detection_preempted_seconds',
+                                      "Time a parking pass waited for ambulance work", ['camera'])
+
+SNAPSHOT_REQUESTS = Counter('parking_snapshot_requests', "Snapshot requests by encode cache result", ['camera', 'result'])
+
+# HTTP; request counts per endpoint come from the histogram _count series
+HTTP_REQUEST_SECONDS = Histogram('http_request_duration_seconds', "Time to produce a response (first byte for streams)",
+                                 ['endpoint', 'method', 'status'])
@@ -0,0 +1,97 @@
+"""
+Motion Gate Module
+Cheap change detector that decides whether the full parking detection pass
+needs to run, by differencing downsampled spot regions against the last
+frame that was actually analysed.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from car_detection import default_layout
+
+
+class MotionGate:
+    """Skip the car cascade while no parking spot has visibly changed"""
+
+    def __init__(self, threshold=6.0, scale=0.25, max_staleness=5.0, layout=None):
+        self.layout = layout or default_layout
+        self.threshold = threshold          # mean absolute grey-level change per spot
+        self.scale = scale                  # downsampling factor for differencing
+        self.max_staleness = max_staleness  # seconds before a full pass is forced
+        self.reference = None
+        self.last_run = 0.0
+        self.last_score = 0.0
+        self.executed_runs = 0
+        self.gated_runs = 0
+        self._spot_boxes = None
+        self._spot_boxes_key = None
+
+    def _prepare(self, frame):
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _scaled_spot_boxes(self, shape):
+        height, width = shape
+        spot_boxes, _ = self.layout.spot_arrays((width, height))
+        if self._spot_boxes_key is not spot_boxes:
+            boxes = spot_boxes.copy()
+            boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+            boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+            # Keep every spot at least one pixel wide so its mean is defined
+            boxes[:, 2] = np.maximum(boxes[:, 2], np.minimum(boxes[:, 0] + 1, width))
+            boxes[:, 3] = np.maximum(boxes[:, 3], np.minimum(boxes[:, 1] + 1, height))
+            self._spot_boxes = boxes
+            self._spot_boxes_key = spot_boxes
+        return self._spot_boxes
+
+    def spot_scores(self, diff):
+        """Mean absolute difference inside each spot, computed from one integral image"""
+        boxes = self._scaled_spot_boxes(diff.shape)
+        if len(boxes) == 0:
+            return np.zeros(0)
+        integral = cv2.integral(diff)
+        x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+        sums = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+        areas = np.maximum((x2 - x1) * (y2 - y1), 1)
+        return sums / areas
+
+    def check(self, frame):
+        """Return True when the full detection pass should run on this frame"""
+        small = self._prepare(frame)
+        now = time.time()
+
+        if self.reference is None or self.reference.shape != small.shape:
+            run = True
+        elif now - self.last_run >= self.max_staleness:
+            run = True
+        else:
+            scores = self.spot_scores(cv2.absdiff(small, self.reference))
+            self.last_score = float(scores.max()) if len(scores) else 0.0
+            run = self.last_score > self.threshold
+
+        if run:
+            self.reference = small
+            self.last_run = now
+            self.executed_runs += 1
+        else:
+            self.gated_runs += 1
+        return run
+
+    def reset(self):
+        """Force the next frame through the full detection pass"""
+        self.reference = None
+
+    def stats(self):
+        total = self.executed_runs + self.gated_runs
+        return {
+            'executed_runs': self.executed_runs,
+            'gated_runs': self.gated_runs,
+            'gated_ratio': self.gated_runs / total if total else 0.0,
+            'last_change_score': self.last_score,
+            'threshold': self.threshold,
+            'max_staleness': self.max_staleness,
+            'last_run': self.last_run
+        }
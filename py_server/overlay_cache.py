@@ -0,0 +1,141 @@
+"""
+Overlay Cache Module
+Pre-renders the static parking overlay and per-state spot sprites once, so
+drawing the overlay on a streamed frame becomes a single masked NumPy copy.
+"""
+
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import car_detection
+from car_detection import (draw_parking_grid_background, draw_section_headers,
+                           draw_driving_lane_grid, draw_parking_spot)
+
+SPRITE_MARGIN = 40  # room around a spot for outlines, labels and status text
+
+
+def render_layer(shape, draw):
+    """Run draw(canvas) on black and white canvases and return (image, mask).
+
+    All overlay primitives are drawn opaquely, so a pixel is part of the layer
+    exactly when both renders agree on its value.
+    """
+    low = np.zeros(shape, dtype=np.uint8)
+    high = np.full(shape, 255, dtype=np.uint8)
+    draw(low)
+    draw(high)
+    mask = np.all(low == high, axis=2)
+    return low, mask
+
+
+def mask_bounds(mask):
+    """Return (y1, y2, x1, x2) of the set pixels in mask, or None if empty"""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+
+class OverlayRenderer:
+    """Caches the overlay layers and the composed overlay per occupancy state"""
+
+    def __init__(self, layout=None, max_composites=16):
+        self.layout = layout or car_detection.default_layout
+        self.max_composites = max_composites
+        self.lock = threading.Lock()
+        self._key = None
+        self._static = None
+        self._sprites = {}
+        self._composites = OrderedDict()
+
+    def _ensure_layout(self, shape):
+        key = (shape, self.layout.version)
+        if key != self._key:
+            self._key = key
+            if self.layout.static_overlay:
+                self._static = render_layer(shape, self._draw_static)
+            else:
+                self._static = (np.zeros(shape, dtype=np.uint8), np.zeros(shape[:2], dtype=bool))
+            self._sprites = {}
+            self._composites = OrderedDict()
+
+    @staticmethod
+    def _draw_static(canvas):
+        draw_parking_grid_background(canvas)
+        draw_section_headers(canvas)
+        draw_driving_lane_grid(canvas)
+
+    def _sprite(self, spot, occupied, frame_shape):
+        """Render a spot in one state; returns (x, y, image, mask) in frame coordinates"""
+        key = (spot['id'], occupied)
+        if key in self._sprites:
+            return self._sprites[key]
+        # Render into the frame-clipped window around the spot so lines that
+        # cross the frame edge are clipped exactly as when drawn on the frame
+        frame_height, frame_width = frame_shape[:2]
+        x0 = max(0, spot['x'] - SPRITE_MARGIN)
+        y0 = max(0, spot['y'] - SPRITE_MARGIN)
+        x1 = min(frame_width, spot['x'] + spot['width'] + SPRITE_MARGIN)
+        y1 = min(frame_height, spot['y'] + spot['height'] + SPRITE_MARGIN)
+        sprite = None
+        if x1 > x0 and y1 > y0:
+            shifted = dict(spot, x=spot['x'] - x0, y=spot['y'] - y0)
+            image, mask = render_layer((y1 - y0, x1 - x0, 3),
+                                       lambda canvas: draw_parking_spot(canvas, shifted, occupied))
+            bounds = mask_bounds(mask)
+            if bounds is not None:
+                by1, by2, bx1, bx2 = bounds
+                sprite = (x0 + bx1, y0 + by1, image[by1:by2, bx1:bx2], mask[by1:by2, bx1:bx2])
+        self._sprites[key] = sprite
+        return sprite
+
+    def _compose(self, occupied):
+        """Static layer with every spot sprite pasted on top, plus its bounding box"""
+        image, mask = self._static[0].copy(), self._static[1].copy()
+
+        for spot in self.layout.spots:
+            sprite = self._sprite(spot, spot['id'] in occupied, mask.shape)
+            if sprite is None:
+                continue
+            x, y, sprite_image, sprite_mask = sprite
+            height, width = sprite_mask.shape
+            np.copyto(image[y:y + height, x:x + width], sprite_image, where=sprite_mask[..., None])
+            mask[y:y + height, x:x + width] |= sprite_mask
+
+        bounds = mask_bounds(mask)
+        if bounds is None:
+            return None
+        y1, y2, x1, x2 = bounds
+        return (y1, y2, x1, x2), image[y1:y2, x1:x2].copy(), mask[y1:y2, x1:x2].astype(np.uint8)
+
+    def get_overlay(self, shape, occupied_spots):
+        occupied = frozenset(occupied_spots)
+        with self.lock:
+            self._ensure_layout(shape)
+            composite = self._composites.get(occupied)
+            if composite is None:
+                composite = self._compose(occupied)
+                self._composites[occupied] = composite
+                if len(self._composites) > self.max_composites:
+                    self._composites.popitem(last=False)
+            else:
+                self._composites.move_to_end(occupied)
+            return composite
+
+    def draw(self, frame, occupied_spots):
+        """Cached equivalent of draw_enhanced_parking_overlay"""
+        composite = self.get_overlay(frame.shape, occupied_spots)
+        if composite is None:
+            return
+        (y1, y2, x1, x2), image, mask = composite
+        # cv2.copyTo writes through the ROI view in place and is far faster than np.copyto(where=)
+        cv2.copyTo(image, mask, frame[y1:y2, x1:x2])
+
+    def invalidate(self):
+        with self.lock:
+            self._key = None
+
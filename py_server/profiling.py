@@ -0,0 +1,207 @@
+"""
+Profiling Module
+On-demand profiling of the running server for a fixed number of seconds.
+
+'sampling' mode walks every thread's stack from a helper thread at a fixed
+interval and needs no cooperation from the profiled code. 'cprofile' mode
+runs a deterministic cProfile per thread; long-running loops and request
+handlers call checkpoint(), which enrols the calling thread while a session
+is open and hands its profile back once the session has ended.
+
+With no session open checkpoint() is a single global check and no helper
+thread exists, so profiling costs nothing when off.
+
+From Python 3.12 cProfile sits on sys.monitoring, which allows one profiler
+per process, so 'cprofile' mode is only offered on older interpreters.
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+MODES = ('sampling', 'cprofile')
+# Per-thread cProfile instances can run side by side only before sys.monitoring
+CPROFILE_AVAILABLE = sys.version_info < (3, 12)
+
+_session = None
+_session_lock = threading.Lock()
+_local = threading.local()
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profiling session is already running"""
+
+
+class ProfilerUnavailable(Exception):
+    """Raised when a mode cannot run on this interpreter"""
+
+
+class ProfileSession:
+    def __init__(self, mode, seconds, interval=0.005):
+        self.mode = mode
+        self.seconds = seconds
+        self.interval = interval
+        self.started = time.time()
+        self.deadline = self.started + seconds
+        self.closed = False
+        self.lock = threading.Lock()
+        self.stacks = Counter()       # sampling: collapsed stack -> samples
+        self.samples = 0
+        self.profiles = []            # cprofile: finished per-thread profilers
+        self.threads = set()          # thread names that contributed
+        self.enrolled = 0
+
+    def _label(self, frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+    def sample(self, skip_thread):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_thread:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            name = names.get(ident, str(ident))
+            stack.append(name)
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.threads.add(name)
+        self.samples += 1
+
+    def run_sampling(self):
+        me = threading.get_ident()
+        while time.time() < self.deadline:
+            started = time.perf_counter()
+            self.sample(me)
+            time.sleep(max(0.0, self.interval - (time.perf_counter() - started)))
+
+    def add_profile(self, profiler):
+        with self.lock:
+            self.profiles.append(profiler)
+            self.threads.add(threading.current_thread().name)
+
+
+def checkpoint():
+    """Enrol the calling thread in an open cProfile session, or hand back its finished profile.
+
+    Never raises: a thread that cannot be profiled simply stays out of the session.
+    """
+    session = _session
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        if session is None or session.closed or session.mode != 'cprofile' or time.time() >= session.deadline:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (or debugger) already owns the interpreter
+            return
+        _local.profiler = profiler
+        _local.session = session
+        with session.lock:
+            session.enrolled += 1
+    elif session is not _local.session or session.closed or time.time() >= _local.session.deadline:
+        release()
+
+
+def release():
+    """Stop profiling the calling thread (e.g. when a request finishes)"""
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    _local.session.add_profile(profiler)
+    _local.profiler = None
+    _local.session = None
+
+
+def run(mode='sampling', seconds=10.0, interval=0.005, grace=1.0):
+    """Profile the whole process for seconds and return the finished session"""
+    global _session
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode: {mode}")
+    if mode == 'cprofile' and not CPROFILE_AVAILABLE:
+        raise ProfilerUnavailable("cprofile mode needs Python < 3.12; use sampling mode")
+    with _session_lock:
+        if _session is not None:
+            raise ProfilerBusy("A profiling session is already running")
+        session = _session = ProfileSession(mode, seconds, interval)
+
+    print(f"🔬 Profiling ({mode}) for {seconds:g}s")
+    try:
+        if mode == 'sampling':
+            session.run_sampling()
+        else:
+            time.sleep(seconds)
+            # Give enrolled threads a moment to reach their next checkpoint
+            wait_until = time.time() + grace
+            while time.time() < wait_until:
+                with session.lock:
+                    if len(session.profiles) >= session.enrolled:
+                        break
+                time.sleep(0.05)
+    finally:
+        session.closed = True
+        with _session_lock:
+            _session = None
+    return session
+
+
+def collapsed(session):
+    """Collapsed stacks ("frame;frame;frame count" per line) for flamegraph tools"""
+    return ''.join(f"{stack} {count}\n" for stack, count in session.stacks.most_common())
+
+
+def sampling_stats(session, limit=50):
+    """Text table of the functions seen most often, by own and inclusive samples"""
+    own, inclusive = Counter(), Counter()
+    for stack, count in session.stacks.items():
+        frames = stack.split(';')[1:]
+        if frames:
+            own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    total = max(sum(session.stacks.values()), 1)
+    lines = [f"{session.samples} sampling rounds over {session.seconds:g}s, "
+             f"{len(session.threads)} threads, {total} thread samples", '',
+             f"{'own %':>7} {'total %':>8}  function"]
+    for frame, count in own.most_common(limit):
+        lines.append(f"{100.0 * count / total:7.2f} {100.0 * inclusive[frame] / total:8.2f}  {frame}")
+    return '\n'.join(lines) + '\n'
+
+
+def _merged_stats(session, stream=None):
+    if not session.profiles:
+        return None
+    stats = pstats.Stats(session.profiles[0], stream=stream)
+    for profiler in session.profiles[1:]:
+        stats.add(profiler)
+    return stats
+
+
+def cprofile_stats(session, sort='cumulative', limit=50):
+    """pstats text report merged across every enrolled thread"""
+    stream = io.StringIO()
+    stream.write(f"cProfile over {session.seconds:g}s across {len(session.profiles)} thread profiles "
+                 f"({', '.join(sorted(session.threads)) or 'none'})\n")
+    if session.enrolled > len(session.profiles):
+        stream.write(f"{session.enrolled - len(session.profiles)} threads had not reported back in time\n")
+    stats = _merged_stats(session, stream)
+    if stats is not None:
+        stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def cprofile_dump(session):
+    """Binary pstats dump (as written by Stats.dump_stats) for snakeviz and friends"""
+    stats = _merged_stats(session)
+    return marshal.dumps(stats.stats if stats is not None else {})
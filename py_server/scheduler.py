@@ -0,0 +1,199 @@
+"""
+Scheduler Module
+CPU budget for the per-camera background work: ambulance checks, parking
+detection and the video stream (overlay plus JPEG encode).
+
+Every task has a priority, a target rate and a floor. Tasks report the time
+each run took, and the scheduler keeps a moving average of that cost. About
+once a second it compares the load at the target rates (cost x fps, in
+cores) with the budget. When the load is over budget it lowers the allowed
+rates of the lowest-priority tasks towards their floors first. Tasks of equal
+priority are cut in proportion, so cameras degrade evenly. The stream
+therefore slows down before parking does, and parking before ambulance checks.
+
+Costs are wall time per run, which includes OpenCV's worker threads and time
+spent waiting on detection pool processes.
+"""
+
+import math
+import os
+import threading
+import time
+
+# Lower numbers are more important and are degraded last
+PRIORITY_AMBULANCE = 0
+PRIORITY_PARKING = 1
+PRIORITY_STREAM = 2
+
+# Seconds of history behind the measured rates, however often a task runs
+RATE_WINDOW = 2.0
+
+
+class ScheduledTask:
+    """Rate limit and cost accounting for one kind of work on one camera.
+
+    target_fps None means unpaced (every frame) until the budget requires a cap.
+    Without a scheduler the task simply runs at its target.
+    """
+
+    def __init__(self, name, camera='', priority=PRIORITY_STREAM, target_fps=None, min_fps=1.0, scheduler=None):
+        self.name = name
+        self.camera = camera
+        self.priority = priority
+        self.target_fps = target_fps
+        self.min_fps = min_fps
+        self.scheduler = scheduler
+        self.cap = None          # rate limit imposed by the budget, None when uncapped
+        self.cost = 0.0          # seconds per run, moving average
+        self.stage_costs = {}
+        self.actual_fps = 0.0
+        self.free_fps = 0.0      # rate an unpaced task reached while uncapped
+        self.runs = 0
+        self.last_start = None
+        if scheduler is not None:
+            scheduler.register(self)
+
+    def set_target(self, fps):
+        self.target_fps = fps
+
+    @property
+    def allowed_fps(self):
+        if self.cap is None:
+            return self.target_fps
+        return self.cap if self.target_fps is None else min(self.target_fps, self.cap)
+
+    def delay(self):
+        """Seconds until the next run is allowed; 0 when it is due"""
+        fps = self.allowed_fps
+        if fps is None or self.last_start is None:
+            return 0.0
+        if fps <= 0:
+            return 1.0
+        return max(0.0, self.last_start + 1.0 / fps - time.time())
+
+    def record(self, started, seconds, stages=None):
+        """Account for one run that began at started (time.time()) and took seconds"""
+        if self.last_start is not None:
+            interval = max(started - self.last_start, 1e-6)
+            weight = 1.0 - math.exp(-interval / RATE_WINDOW)
+            self.actual_fps += weight * (1.0 / interval - self.actual_fps)
+            if self.cap is None:
+                self.free_fps = self.actual_fps
+        self.last_start = started
+        self.cost = seconds if not self.runs else 0.9 * self.cost + 0.1 * seconds
+        for stage, value in (stages or {}).items():
+            previous = self.stage_costs.get(stage)
+            self.stage_costs[stage] = value if previous is None else 0.9 * previous + 0.1 * value
+        self.runs += 1
+        if self.scheduler is not None:
+            self.scheduler.maybe_rebalance()
+
+    def demand_fps(self):
+        """Rate the task would run at without a budget"""
+        if self.target_fps is None:
+            # A capped task's own rate says nothing about what it would take uncapped
+            return max(self.free_fps, self.min_fps)
+        return self.target_fps
+
+    def stats(self):
+        return {
+            'camera': self.camera,
+            'task': self.name,
+            'priority': self.priority,
+            'target_fps': round(self.target_fps, 2) if self.target_fps is not None else None,
+            'allowed_fps': round(self.allowed_fps, 2) if self.allowed_fps is not None else None,
+            'actual_fps': round(self.actual_fps, 2),
+            'capped': self.cap is not None,
+            'cost_ms': round(self.cost * 1000.0, 3),
+            'stage_costs_ms': {stage: round(value * 1000.0, 3) for stage, value in self.stage_costs.items()},
+            'load': round(self.cost * self.actual_fps, 3)
+        }
+
+
+class CpuScheduler:
+    """Shares a CPU budget, in cores, between registered tasks by priority"""
+
+    def __init__(self, budget=None, interval=1.0):
+        self.budget = budget          # None or 0 disables throttling
+        self.interval = interval
+        self.tasks = []
+        self.lock = threading.Lock()
+        self.last_rebalance = 0.0
+        self.demand = 0.0             # cores needed at the target rates
+        self.allocated = 0.0          # cores at the allowed rates
+        self._cpu_mark = (time.time(), time.process_time())
+        self.process_cpu = 0.0        # cores the whole process actually used
+
+    def register(self, task):
+        with self.lock:
+            self.tasks.append(task)
+
+    def unregister(self, task):
+        with self.lock:
+            if task in self.tasks:
+                self.tasks.remove(task)
+
+    def task(self, name, camera='', priority=PRIORITY_STREAM, target_fps=None, min_fps=1.0):
+        return ScheduledTask(name, camera, priority, target_fps, min_fps, scheduler=self)
+
+    def maybe_rebalance(self):
+        now = time.time()
+        if now - self.last_rebalance >= self.interval:
+            self.rebalance(now)
+
+    def rebalance(self, now=None):
+        """Recompute every task's allowed rate from its measured cost"""
+        now = now or time.time()
+        with self.lock:
+            if now - self.last_rebalance < self.interval / 2:
+                return
+            self.last_rebalance = now
+            tasks = list(self.tasks)
+
+            wall, cpu = time.time(), time.process_time()
+            mark_wall, mark_cpu = self._cpu_mark
+            if wall > mark_wall:
+                self.process_cpu = (cpu - mark_cpu) / (wall - mark_wall)
+            self._cpu_mark = (wall, cpu)
+
+            rates = {task: task.demand_fps() for task in tasks}
+            self.demand = load = sum(task.cost * rate for task, rate in rates.items())
+            if self.budget:
+                # Cut the least important group first, each task in proportion to what it can give up
+                for priority in sorted({task.priority for task in tasks}, reverse=True):
+                    if load <= self.budget:
+                        break
+                    group = [task for task in tasks if task.priority == priority]
+                    reducible = sum(task.cost * max(0.0, rates[task] - task.min_fps) for task in group)
+                    if reducible <= 0:
+                        continue
+                    fraction = min(1.0, (load - self.budget) / reducible)
+                    for task in group:
+                        cut = fraction * max(0.0, rates[task] - task.min_fps)
+                        rates[task] -= cut
+                        load -= cut * task.cost
+            self.allocated = load
+
+            for task in tasks:
+                task.cap = rates[task] if self.budget and rates[task] < task.demand_fps() - 1e-6 else None
+
+    def stats(self):
+        with self.lock:
+            tasks = [task.stats() for task in self.tasks]
+        return {
+            'budget_cores': self.budget or None,
+            'demand_cores': round(self.demand, 3),
+            'allocated_cores': round(self.allocated, 3),
+            'budget_used': round(self.allocated / self.budget, 3) if self.budget else None,
+            'process_cpu_cores': round(self.process_cpu, 3),
+            'degraded': [f"{task['camera']}/{task['task']}" for task in tasks if task['capped']],
+            'tasks': tasks
+        }
+
+
+def default_budget():
+    """CPU_BUDGET in cores; defaults to 80% of the machine, 0 disables the budget"""
+    value = os.getenv('CPU_BUDGET')
+    if value is not None:
+        return float(value)
+    return round((os.cpu_count() or 1) * 0.8, 2)
@@ -0,0 +1,201 @@
+"""
+Spot State Module
+Debounces raw per-frame occupancy with a per-spot hysteresis state machine
+and records real transitions in a bounded, cursor-addressable event log.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+
+class EventLog:
+    """Bounded in-memory log of parking events with monotonically increasing cursors"""
+
+    def __init__(self, maxlen=1000):
+        self.events = deque(maxlen=maxlen)
+        self.cursor = 0
+        self.condition = threading.Condition()
+
+    def append(self, event):
+        with self.condition:
+            self.cursor += 1
+            event = dict(event, cursor=self.cursor)
+            self.events.append(event)
+            self.condition.notify_all()
+            return event
+
+    def since(self, cursor, event_types=None):
+        """Return (events after cursor, latest cursor, truncated).
+
+        truncated is True when events after cursor have already been evicted,
+        in which case the client should refetch the full state.
+        """
+        with self.condition:
+            return self._since(cursor, event_types)
+
+    def wait_since(self, cursor, event_types=None, timeout=None):
+        """Like since(), but block up to timeout seconds for an event after cursor"""
+        with self.condition:
+            if cursor is not None:
+                self.condition.wait_for(lambda: self.cursor > cursor, timeout=timeout)
+            return self._since(cursor, event_types)
+
+    def _since(self, cursor, event_types):
+        if cursor is None or cursor >= self.cursor:
+            return [], self.cursor, False
+        oldest = self.events[0]['cursor'] if self.events else self.cursor + 1
+        truncated = cursor < oldest - 1
+        events = [event for event in self.events
+                  if event['cursor'] > cursor and (event_types is None or event['event'] in event_types)]
+        return events, self.cursor, truncated
+
+
+class SpotStateTracker:
+    """Per-spot hysteresis: a spot flips only after enough consecutive agreeing frames"""
+
+    def __init__(self, spots, event_log, enter_frames=3, exit_frames=5, history_size=1000):
+        self.event_log = event_log
+        self.enter_frames = enter_frames
+        self.exit_frames = exit_frames
+        self.history_size = history_size
+        self.layout_generation = 0
+        self.lock = threading.Lock()
+        self.set_spots(spots)
+
+    def set_spots(self, spots):
+        """Reset tracking for a new spot layout"""
+        with self.lock:
+            self.spots = {spot['id']: spot for spot in spots}
+            self.spot_index = {spot_id: index for index, spot_id in enumerate(self.spots)}
+            self.occupied = {spot_id: False for spot_id in self.spots}
+            self.streaks = {spot_id: 0 for spot_id in self.spots}
+            self.cars = {}
+            self.initialized = False
+            self.updated_at = 0.0
+            self.changed_at = time.time()
+            # version counts debounced state changes; history maps versions to spot flips
+            self.version = 0
+            self.history = deque(maxlen=self.history_size)
+            self.layout_generation += 1
+
+    def update(self, result):
+        """Feed one detection snapshot; returns the transitions it caused"""
+        raw_occupied = set(result.occupied_spots)
+        transitions = []
+
+        with self.lock:
+            self.updated_at = result.processed_at
+            for spot_id, car in result.spot_cars.items():
+                self.cars[spot_id] = car
+
+            # The first snapshot seeds the state without emitting events
+            if not self.initialized:
+                for spot_id in self.spots:
+                    self.occupied[spot_id] = spot_id in raw_occupied
+                self.initialized = True
+                self.version += 1
+                self.changed_at = result.processed_at
+                # Seeding is not expressible as a delta, so older versions need a full refetch
+                self.history.clear()
+                return transitions
+
+            # A motion-gated snapshot repeats the last analysed frame; it is not new evidence.
+            # The detector skips the gate while settling(), so streaks finish on analysed frames
+            if result.gated:
+                return transitions
+
+            for spot_id, spot in self.spots.items():
+                observed = spot_id in raw_occupied
+                if observed == self.occupied[spot_id]:
+                    self.streaks[spot_id] = 0
+                    continue
+
+                self.streaks[spot_id] += 1
+                required = self.enter_frames if observed else self.exit_frames
+                if self.streaks[spot_id] >= required:
+                    self.occupied[spot_id] = observed
+                    self.streaks[spot_id] = 0
+                    self.version += 1
+                    self.changed_at = result.processed_at
+                    self.history.append((self.version, spot_id, observed))
+                    if not observed:
+                        self.cars.pop(spot_id, None)
+                    transitions.append({
+                        'event': 'car_parked' if observed else 'car_left',
+                        'spot_id': spot_id,
+                        'section': spot.get('section', ''),
+                        'timestamp': datetime.fromtimestamp(result.processed_at, timezone.utc).isoformat()
+                    })
+
+        return [self.event_log.append(transition) for transition in transitions]
+
+    def settling(self):
+        """True while any spot has a partial streak, i.e. a flip awaits more frames"""
+        with self.lock:
+            return any(self.streaks.values())
+
+    def occupied_spots(self):
+        with self.lock:
+            return [spot_id for spot_id in self.spots if self.occupied[spot_id]]
+
+    def status(self):
+        """Return (version, time of last change, occupied spot ids) read atomically"""
+        with self.lock:
+            occupied_spots = [spot_id for spot_id in self.spots if self.occupied[spot_id]]
+            return self.version, self.changed_at, occupied_spots
+
+    def state_version(self):
+        """Opaque version string that changes whenever the debounced state or layout changes"""
+        with self.lock:
+            return f"{self.layout_generation}.{self.version}"
+
+    def bitset(self):
+        """Return (version, occupancy packed one bit per spot in layout order, LSB first)"""
+        with self.lock:
+            bits = bytearray((len(self.spots) + 7) // 8)
+            for spot_id, index in self.spot_index.items():
+                if self.occupied[spot_id]:
+                    bits[index >> 3] |= 1 << (index & 7)
+            return self.version, bytes(bits)
+
+    def changes_since(self, version):
+        """Return (current version, [(spot_id, occupied)], complete) for changes after version.
+
+        complete is False when the history no longer reaches back to version,
+        in which case the caller must send the full state instead.
+        """
+        with self.lock:
+            if version >= self.version:
+                return self.version, [], version == self.version
+            oldest = self.history[0][0] if self.history else self.version + 1
+            if version < oldest - 1:
+                return self.version, [], False
+            latest = {}
+            for entry_version, spot_id, occupied in self.history:
+                if entry_version > version:
+                    latest[spot_id] = occupied
+            return self.version, list(latest.items()), True
+
+    def snapshot(self):
+        """Debounced parking state in the shape the frontend expects"""
+        with self.lock:
+            occupied_spots = [spot_id for spot_id in self.spots if self.occupied[spot_id]]
+            detected_cars = []
+            for spot_id in occupied_spots:
+                car = self.cars.get(spot_id)
+                if car is None:
+                    continue
+                x, y, w, h = car
+                detected_cars.append({
+                    'spot_id': spot_id,
+                    'car': {'x': x, 'y': y, 'width': w, 'height': h},
+                    'section': self.spots[spot_id].get('section', '')
+                })
+            return {
+                'occupied_spots': occupied_spots,
+                'detected_cars': detected_cars,
+                'total_spots': len(self.spots),
+                'timestamp': self.updated_at or time.time()
+            }
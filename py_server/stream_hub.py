@@ -0,0 +1,252 @@
+"""
+Stream Hub Module
+Renders and JPEG-encodes each annotated frame once and fans the same bytes
+out to every /video_feed subscriber.
+
+Each subscriber has its own target rate and always receives the newest
+frame when it is due; frames it was too slow for are skipped, never queued.
+A client whose connection stops draining is disconnected after
+stall_timeout seconds.
+
+SnapshotCache serves stills: the annotated frame is rendered at most once
+per refresh interval and encoded once per (width, quality) tier.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+from car_detection import resize_to_feed
+from metrics import (ENCODE_SECONDS, FRAME_AGE_SECONDS, OVERLAY_SECONDS, SNAPSHOT_REQUESTS,
+                     STREAM_SKIPPED_FRAMES, STREAM_STALLED_CLIENTS)
+from overlay_cache import OverlayRenderer
+from profiling import checkpoint
+from scheduler import PRIORITY_STREAM, ScheduledTask
+
+
+class FrameBroadcaster:
+    """Encode-once MJPEG broadcaster shared by all video feed clients"""
+
+    def __init__(self, camera, detector, layout=None, max_fps=30, default_fps=10, jpeg_quality=80,
+                 stall_timeout=10.0, task=None):
+        self.camera = camera
+        self.detector = detector
+        self.layout = layout
+        self.renderer = OverlayRenderer(layout)
+        self.max_fps = max_fps              # upper bound for any client
+        self.default_fps = min(default_fps, max_fps)
+        self.jpeg_quality = jpeg_quality
+        self.stall_timeout = stall_timeout
+        # Overlay and encode run together once per streamed frame; a CPU budget may lower the rate
+        self.task = task or ScheduledTask('stream', camera.name, PRIORITY_STREAM)
+        self.client_fps = {}                # client id -> target fps
+        self._next_client = 0
+        self.condition = threading.Condition()
+        self.jpeg = None
+        self.captured_at = 0.0
+        self.seq = 0
+        self.subscribers = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(), name=f"stream-{camera.name}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        last_frame_seq = 0
+        while self.running:
+            checkpoint()
+            # Do no work while nobody is watching
+            with self.condition:
+                if not self.subscribers:
+                    self.task.set_target(0)
+                self.condition.wait_for(lambda: not self.running or self.subscribers > 0)
+                # Render only as often as the fastest client wants frames
+                self.task.set_target(max(self.client_fps.values(), default=self.default_fps))
+            if not self.running:
+                break
+
+            delay = self.task.delay()
+            if delay > 0:
+                time.sleep(min(delay, 1.0))
+                continue
+
+            lease = self.camera.acquire(after_seq=last_frame_seq, timeout=0.5)
+            if lease is None:
+                if not self.camera.running:
+                    break
+                continue
+            with lease:
+                last_frame_seq = lease.seq
+                captured_at = lease.timestamp
+                jpeg = self.render(lease.frame)
+            if jpeg is not None:
+                with self.condition:
+                    self.jpeg = jpeg
+                    self.captured_at = captured_at
+                    self.seq += 1
+                    self.condition.notify_all()
+
+        with self.condition:
+            self.condition.notify_all()
+
+    def annotate(self, frame):
+        """Return a feed-resolution copy of frame with the parking overlay drawn on it"""
+        result = self.detector.latest()
+        occupied_spots = list(result.occupied_spots) if result is not None else []
+
+        annotated = resize_to_feed(frame, self.layout)
+        if annotated is frame:
+            annotated = frame.copy()
+        self.renderer.draw(annotated, occupied_spots)
+        return annotated
+
+    def render(self, frame):
+        """Annotate the frame and encode it as a multipart JPEG part"""
+        started_at = time.time()
+        started = time.perf_counter()
+        annotated = self.annotate(frame)
+        drawn = time.perf_counter()
+
+        (flag, encodedImage) = cv2.imencode(".jpg", annotated, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        encoded = time.perf_counter()
+        OVERLAY_SECONDS.observe(drawn - started, self.camera.name)
+        ENCODE_SECONDS.observe(encoded - drawn, self.camera.name)
+        self.task.record(started_at, encoded - started, {'overlay': drawn - started, 'encode': encoded - drawn})
+        if not flag:
+            return None
+        return (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' +
+                encodedImage.tobytes() + b'\r\n')
+
+    def wait_for_frame(self, after_seq, timeout=None):
+        """Return (seq, jpeg part, capture time) for the newest frame after after_seq; intermediate frames are skipped"""
+        with self.condition:
+            self.condition.wait_for(lambda: not self.running or self.seq > after_seq, timeout=timeout)
+            return self.seq, self.jpeg, self.captured_at
+
+    def subscribe(self, fps=None, sock=None):
+        """Generator yielding multipart JPEG parts at up to fps; slow clients only ever see the latest frame.
+
+        sock, the client's socket when the server exposes it, gets a send
+        timeout so a connection that stops draining fails instead of
+        pinning the thread.
+        """
+        fps = min(fps or self.default_fps, self.max_fps)
+        interval = 1.0 / fps
+        with self.condition:
+            self._next_client += 1
+            client_id = self._next_client
+            self.client_fps[client_id] = fps
+            self.subscribers += 1
+            self.condition.notify_all()
+        if sock is not None and self.stall_timeout:
+            try:
+                sock.settimeout(self.stall_timeout)
+            except OSError:
+                pass
+
+        sent_at = None
+        try:
+            last_seq = 0
+            next_send = 0.0
+            while self.running:
+                checkpoint()
+                # Sleep until due, then take whatever frame is newest at that point
+                delay = next_send - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                seq, jpeg, captured_at = self.wait_for_frame(last_seq, timeout=5.0)
+                if seq == last_seq or jpeg is None:
+                    if not self.camera.running:
+                        break
+                    continue
+                if last_seq and seq > last_seq + 1:
+                    STREAM_SKIPPED_FRAMES.inc(seq - last_seq - 1, self.camera.name)
+                last_seq = seq
+                FRAME_AGE_SECONDS.observe(time.time() - captured_at, self.camera.name)
+
+                sent_at = time.time()
+                next_send = sent_at + interval
+                yield jpeg
+                # Control comes back once the server has written the part
+                if time.time() - sent_at > self.stall_timeout:
+                    self._stalled(client_id)
+                    break
+                sent_at = None
+        except GeneratorExit:
+            # Closed mid-write: the send timeout fired on a stalled connection
+            if sent_at is not None and time.time() - sent_at >= self.stall_timeout:
+                self._stalled(client_id)
+            raise
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+                self.client_fps.pop(client_id, None)
+
+    def _stalled(self, client_id):
+        STREAM_STALLED_CLIENTS.inc(1, self.camera.name)
+        print(f"⚠️ Disconnecting stalled video client {client_id} on camera {self.camera.name}")
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join()
+
+
+class SnapshotCache:
+    """Annotated stills at several sizes, each encoded once per captured frame"""
+
+    def __init__(self, camera, broadcaster, min_interval=0.2, max_tiers=8):
+        self.camera = camera
+        self.broadcaster = broadcaster
+        self.min_interval = min_interval  # newest frame is re-rendered at most this often
+        self.max_tiers = max_tiers
+        self.lock = threading.Lock()
+        self.base = None
+        self.base_seq = 0
+        self.base_time = 0.0
+        self.tiers = OrderedDict()  # (width, quality) -> (height, jpeg bytes)
+
+    def _refresh(self):
+        if self.base is not None and time.time() - self.base_time < self.min_interval:
+            return
+        lease = self.camera.acquire(after_seq=self.base_seq, timeout=0)
+        if lease is None:
+            return
+        with lease:
+            self.base = self.broadcaster.annotate(lease.frame)
+            self.base_seq = lease.seq
+        self.base_time = time.time()
+        self.tiers.clear()
+
+    def get(self, width=None, quality=80):
+        """Return (frame seq, width, jpeg bytes) for the newest frame, or (None, None, None) before the first one"""
+        with self.lock:
+            self._refresh()
+            if self.base is None:
+                return None, None, None
+            feed_height, feed_width = self.base.shape[:2]
+            width = min(max(int(width or feed_width), 16), feed_width)
+            key = (width, quality)
+
+            jpeg = self.tiers.get(key)
+            if jpeg is not None:
+                self.tiers.move_to_end(key)
+                SNAPSHOT_REQUESTS.inc(1, self.camera.name, 'hit')
+                return self.base_seq, width, jpeg
+
+            image = self.base
+            if width != feed_width:
+                height = max(1, round(feed_height * width / feed_width))
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            flag, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not flag:
+                return None, None, None
+            jpeg = encoded.tobytes()
+            self.tiers[key] = jpeg
+            while len(self.tiers) > self.max_tiers:
+                self.tiers.popitem(last=False)
+            SNAPSHOT_REQUESTS.inc(1, self.camera.name, 'miss')
+            return self.base_seq, width, jpeg
@@ -0,0 +1,93 @@
+"""
+Pins the vectorized spot assignment to the original per-spot IoU loop, and
+the grid-indexed assignment to the vectorized one, on random layouts.
+"""
+
+import numpy as np
+import pytest
+
+from car_detection import (PARKING_SPOTS, SpotGrid, assign_detections, assign_detections_indexed,
+                           calculate_iou, default_layout)
+
+
+def scalar_assign(cars, spot_boxes, thresholds):
+    """The per-spot loop assign_detections replaced"""
+    best_match, best_iou = [], []
+    for spot_box, threshold in zip(spot_boxes.tolist(), thresholds.tolist()):
+        match, max_iou = -1, 0
+        for index, (x, y, w, h) in enumerate(cars):
+            iou = calculate_iou([x, y, x + w, y + h], spot_box)
+            if iou > threshold and iou > max_iou:
+                match, max_iou = index, iou
+        best_match.append(match)
+        best_iou.append(max_iou)
+    return np.array(best_match), np.array(best_iou, dtype=np.float64)
+
+
+def random_spots(rng, count, extent=2000):
+    x = rng.integers(0, extent, count)
+    y = rng.integers(0, extent, count)
+    w = rng.integers(20, 160, count)
+    h = rng.integers(20, 120, count)
+    return np.stack([x, y, x + w, y + h], axis=1).astype(np.int64)
+
+
+def random_cars(rng, spot_boxes, count):
+    """Detections jittered around random spots, plus a few strays and degenerate boxes"""
+    cars = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.8 and len(spot_boxes):
+            x1, y1, x2, y2 = spot_boxes[rng.integers(len(spot_boxes))]
+            w, h = x2 - x1, y2 - y1
+            cars.append((int(x1 + rng.integers(-w // 2, w // 2 + 1)), int(y1 + rng.integers(-h // 2, h // 2 + 1)),
+                         int(max(0, w + rng.integers(-w // 2, w // 2 + 1))),
+                         int(max(0, h + rng.integers(-h // 2, h // 2 + 1)))))
+        elif kind < 0.95:
+            cars.append(tuple(int(v) for v in rng.integers(0, 2000, 2)) + tuple(int(v) for v in rng.integers(1, 200, 2)))
+        else:
+            cars.append((int(rng.integers(0, 2000)), int(rng.integers(0, 2000)), 0, int(rng.integers(0, 50))))
+    # Exact duplicates exercise the first-detection tie-break
+    if cars and rng.random() < 0.5:
+        cars.insert(int(rng.integers(len(cars) + 1)), cars[int(rng.integers(len(cars)))])
+    return cars
+
+
+def assert_same_assignment(actual, expected_match, expected_iou):
+    best_match, best_iou, occupied = actual
+    np.testing.assert_array_equal(best_match, expected_match)
+    np.testing.assert_allclose(best_iou, expected_iou, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(occupied, expected_match >= 0)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_assign_detections_matches_scalar_loop(seed):
+    rng = np.random.default_rng(seed)
+    spot_boxes = random_spots(rng, int(rng.integers(1, 40)))
+    thresholds = rng.uniform(0.0, 0.5, len(spot_boxes))
+    cars = random_cars(rng, spot_boxes, int(rng.integers(0, 30)))
+
+    assert_same_assignment(assign_detections(cars, spot_boxes, thresholds), *scalar_assign(cars, spot_boxes, thresholds))
+
+
+def test_assign_detections_matches_scalar_loop_on_default_layout():
+    rng = np.random.default_rng(0)
+    spot_boxes, thresholds = default_layout.spot_arrays()
+    assert len(spot_boxes) == len(PARKING_SPOTS)
+    for _ in range(20):
+        cars = random_cars(rng, spot_boxes, int(rng.integers(0, 15)))
+        assert_same_assignment(assign_detections(cars, spot_boxes, thresholds),
+                               *scalar_assign(cars, spot_boxes, thresholds))
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_assign_detections_indexed_matches_assign_detections(seed):
+    rng = np.random.default_rng(1000 + seed)
+    spot_boxes = random_spots(rng, int(rng.integers(1, 401)))
+    thresholds = rng.uniform(0.0, 0.5, len(spot_boxes))
+    cars = random_cars(rng, spot_boxes, int(rng.integers(0, 200)))
+    cell_size = None if seed % 2 else int(rng.integers(8, 400))
+
+    expected_match, expected_iou, _ = assign_detections(cars, spot_boxes, thresholds)
+    assert_same_assignment(assign_detections_indexed(cars, thresholds, SpotGrid(spot_boxes, cell_size)),
+                           expected_match, expected_iou)
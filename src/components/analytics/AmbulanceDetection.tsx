@@ -10,24 +10,24 @@ const AmbulanceDetection: React.FC = () => {
   const { location } = useGeolocation();
 
   useEffect(() => {
-    let detectionInterval: NodeJS.Timeout;
-    if (isDetecting && !ambulanceDetected) {
-      detectionInterval = setInterval(async () => {
-        try {
-          const response = await fetch('http://localhost:5001/ambulance_detection');
-          const data = await response.json();
-          if (data.ambulance_detected) {
-            setAmbulanceDetected(true);
-          }
-        } catch (error) {
-          console.error('Error detecting ambulance:', error);
-        }
-      }, 1000); // Check for ambulance every second
+    if (!isDetecting || ambulanceDetected) {
+      return;
     }
-    return () => {
-      if (detectionInterval) {
-        clearInterval(detectionInterval);
+    // Alerts are pushed as soon as the server confirms a sighting
+    const alerts = new EventSource('http://localhost:5001/events?type=ambulance_detected');
+    alerts.addEventListener('status', (event) => {
+      if (JSON.parse((event as MessageEvent).data).ambulance_detected) {
+        setAmbulanceDetected(true);
       }
+    });
+    alerts.addEventListener('ambulance_detected', () => {
+      setAmbulanceDetected(true);
+    });
+    alerts.onerror = (error) => {
+      console.error('Error in ambulance alert stream:', error);
+    };
+    return () => {
+      alerts.close();
     };
   }, [isDetecting, ambulanceDetected]);
 
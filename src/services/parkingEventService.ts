@@ -8,6 +8,8 @@ interface ParkingEvent {
 interface ParkingEventResponse {
   events: ParkingEvent[];
   timestamp: number;
+  cursor?: number;
+  truncated?: boolean;
 }
 
 interface ParkingStatusResponse {
@@ -24,6 +26,7 @@ interface ParkingStatusResponse {
   }>;
   total_spots: number;
   timestamp?: number;
+  cursor?: number;
 }
 
 class ParkingEventService {
@@ -31,6 +34,7 @@ class ParkingEventService {
   private statusListeners: Array<(status: ParkingStatusResponse) => void> = [];
   private isPollingEvents = false;
   private eventPollingInterval: NodeJS.Timeout | null = null;
+  private eventCursor: number | null = null;
   private baseUrl = 'http://127.0.0.1:5002';
 
   // Subscribe to parking events
@@ -70,7 +74,11 @@ class ParkingEventService {
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
-      return await response.json();
+      const status: ParkingStatusResponse = await response.json();
+      if (typeof status.cursor === 'number') {
+        this.eventCursor = status.cursor;
+      }
+      return status;
     } catch (error) {
       console.error('Error fetching initial parking status:', error);
       throw error;
@@ -98,13 +106,23 @@ class ParkingEventService {
     this.isPollingEvents = true;
     this.eventPollingInterval = setInterval(async () => {
       try {
-        const response = await fetch(`${this.baseUrl}/parking_events`);
+        // Only fetch events newer than the last cursor we have seen
+        const query = this.eventCursor !== null ? `?since=${this.eventCursor}` : '';
+        const response = await fetch(`${this.baseUrl}/parking_events${query}`);
         if (!response.ok) {
           throw new Error(`HTTP error! status: ${response.status}`);
         }
 
         const data: ParkingEventResponse = await response.json();
-        
+        if (typeof data.cursor === 'number') {
+          this.eventCursor = data.cursor;
+        }
+
+        if (data.truncated) {
+          // Missed events were evicted server-side; resync the full state
+          await this.refreshParkingStatus();
+        }
+
         if (data.events && data.events.length > 0) {
           // Notify all event listeners
           this.eventListeners.forEach(callback => {